@@ -1,4 +1,5 @@
 import os
+from pipeline_utils.column_manifest import get_stage_columns
 
 
 class Bond_profile_config():
@@ -14,6 +15,12 @@ class Bond_profile_config():
 
         self.cbond_tables_dir = os.path.join(cbond_tables_dir, data_version)
 
+        ### Raw columns in use (declared in pipeline_utils.column_manifest, only these columns are extracted and loaded)
+        self.cbonddescription_cols = get_stage_columns('generate_bond_profile_features', 'cbonddescriptionzl')
+        self.cbondissuer_cols = get_stage_columns('generate_bond_profile_features', 'cbondissuerzl')
+        self.cbondindustrywind_cols = get_stage_columns('generate_bond_profile_features', 'cbondindustrywindzl')
+        self.cbonddefaultreportform_cols = get_stage_columns('generate_bond_profile_features', 'cbonddefaultreportform')
+
         ### processed data
         processed_date_dir = '/mnt/utnfs/data/sentiment_score_pipeline/data/processed_data'
         processing_version = os.path.abspath(os.path.join(os.getcwd(), os.pardir)).split('/')[-1]
@@ -25,5 +32,8 @@ class Bond_profile_config():
         ### output files name
         self.bond_profile = 'bond_profile.pkl'
 
+        ### Save bond_profile with the compact dtypes of pipeline_utils.table_schema (categorical codes, Int32 dates)
+        self.compact_dtypes = True
+
 if __name__ == '__main__':
     config = Bond_profile_config()
@@ -1,6 +1,8 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_bond_profile_features')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
+from pipeline_utils import snapshot_io, table_schema
 import bond_profile_processing
 import bond_profile_bond
 from bond_profile_config import Bond_profile_config
@@ -17,10 +19,10 @@ def generate_bond_profile_features(data_date=None):
     input_path = bond_profile_config.cbond_tables_dir
     output_path = bond_profile_config.bond_profile_output_dir
 
-    cbonddescription = pd.read_pickle(os.path.join(input_path, 'cbonddescriptionzl.pkl.gz'))
-    cbondissuer = pd.read_pickle(os.path.join(input_path, 'cbondissuerzl.pkl.gz'))
-    cbondindustrywind = pd.read_pickle(os.path.join(input_path, 'cbondindustrywindzl.pkl.gz'))
-    cbonddefaultreportform = pd.read_pickle(os.path.join(input_path, 'cbonddefaultreportform.pkl.gz'))
+    cbonddescription = snapshot_io.read_snapshot_table(input_path, 'cbonddescriptionzl', columns=bond_profile_config.cbonddescription_cols)
+    cbondissuer = snapshot_io.read_snapshot_table(input_path, 'cbondissuerzl', columns=bond_profile_config.cbondissuer_cols)
+    cbondindustrywind = snapshot_io.read_snapshot_table(input_path, 'cbondindustrywindzl', columns=bond_profile_config.cbondindustrywind_cols)
+    cbonddefaultreportform = snapshot_io.read_snapshot_table(input_path, 'cbonddefaultreportform', columns=bond_profile_config.cbonddefaultreportform_cols)
 
     # ----- Pre-processing ----- #
     ####################################################################################################################
@@ -49,6 +51,8 @@ def generate_bond_profile_features(data_date=None):
     if not os.path.exists(output_path):
         os.makedirs(output_path)
 
+    if bond_profile_config.compact_dtypes:
+        df_bond = table_schema.compact_table(df_bond, 'bond_profile')
     df_bond.to_pickle(os.path.join(output_path, bond_profile_config.bond_profile))
 
     return df_bond
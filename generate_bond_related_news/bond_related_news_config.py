@@ -20,10 +20,31 @@ class Bond_related_news_config():
         bond_profile_input_dir = os.path.join(processed_date_dir, processing_version, 'features_data/bond_profile')
         
         bond_related_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/bond_related_news')
+        news_issuer_index_dir = os.path.join(processed_date_dir, processing_version, 'features_data/news_issuer_index')
         
         self.second_filter_input_dir = os.path.join(second_filter_input_dir, data_version)
         self.bond_profile_input_dir = os.path.join(bond_profile_input_dir, data_version)
         self.bond_related_output_dir = os.path.join(bond_related_output_dir, data_version)
+        self.news_issuer_index_dir = os.path.join(news_issuer_index_dir, data_version)
+        
+        ### Hand the news frames and the bond references to the workers through shared memory (pipeline_utils.shared_frame)
+        ### instead of pickling them into every task
+        self.shared_frames = True
+        
+        ### Format of the output files: 'parquet' keeps s_info_windcode / b_info_issuercode as lists, 'csv' writes them as reprs
+        self.stage_format = 'parquet'
+        
+        ### Link news to the issuers named in FormatTitle/FormatContent (b_info_issuer, b_info_fullname and aliases), besides
+        ### the Windcodes tags. The alias file is a csv with columns 'b_info_issuercode' and 'alias', None for no aliases.
+        ### Names shorter than issuer_name_min_length characters are not searched.
+        ### Requires the pyahocorasick package (pip install pyahocorasick), imported only when issuer_linking is True
+        self.issuer_linking = True
+        self.issuer_alias_path = None
+        self.issuer_name_min_length = 4
+        
+        ### Save the inverted index between News_ID and b_info_issuercode of the bond related news (pipeline_utils.news_issuer_index)
+        ### into news_issuer_index_dir, for issuer drilldowns and partial recomputations without reading the daily files
+        self.build_news_issuer_index = True
         
 if __name__ == '__main__':
     config = Bond_related_news_config()
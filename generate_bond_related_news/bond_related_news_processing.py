@@ -1,37 +1,141 @@
 import pandas as pd
 import os
 import numpy as np
+from pipeline_utils import stage_io
 
-def bond_related_processing(dataframe, s_info_windcode, b_info_issuercode, config):
+def get_bond_code_index(bond_profile):
+    """
+    :param bond_profile: bond_profile DataFrame of those 4 bond groups
+    :return: Series indexed by code (hash index), 1 for s_info_windcode, 2 for b_info_issuercode, 3 for both
+    """
+    s_info_windcode = pd.Series(1, index=pd.unique(bond_profile.s_info_windcode.dropna().astype(str)))
+    b_info_issuercode = pd.Series(2, index=pd.unique(bond_profile.b_info_issuercode.dropna().astype(str)))
+    bond_code_index = s_info_windcode.add(b_info_issuercode, fill_value=0).astype(np.int8)
+    # Build the hash table of the index now, it is kept with the index for all days
+    bond_code_index.index.get_indexer(bond_code_index.index[:1])
+    return bond_code_index
+
+def get_issuer_names(bond_profile, alias_path=None, min_length=4):
+    """
+    :param bond_profile: bond_profile DataFrame of those 4 bond groups
+    :param alias_path: csv file of other names of the issuers, with columns 'b_info_issuercode' and 'alias', None for no aliases
+    :param min_length: names shorter than this are not searched, they match too many unrelated words
+    :return: DataFrame of 'name' and 'b_info_issuercode', one row per distinct pair
+    """
+    issuer_names = [bond_profile[['b_info_issuer', 'b_info_issuercode']].set_axis(['name', 'b_info_issuercode'], axis=1),
+                    bond_profile[['b_info_fullname', 'b_info_issuercode']].set_axis(['name', 'b_info_issuercode'], axis=1)]
+    if alias_path is not None:
+        issuer_names.append(pd.read_csv(alias_path, dtype=str)[['alias', 'b_info_issuercode']].set_axis(['name', 'b_info_issuercode'], axis=1))
+    issuer_names = pd.concat(issuer_names).dropna().astype(str)
+    
+    # Names are searched in FormatTitle/FormatContent, which have no whitespaces, and news write brackets in both widths
+    issuer_names['name'] = issuer_names['name'].str.replace(r'\s', '', regex=True)
+    fullwidth_names = issuer_names.assign(name=issuer_names['name'].str.replace('(', '（', regex=False).str.replace(')', '）', regex=False))
+    halfwidth_names = issuer_names.assign(name=issuer_names['name'].str.replace('（', '(', regex=False).str.replace('）', ')', regex=False))
+    issuer_names = pd.concat([issuer_names, fullwidth_names, halfwidth_names])
+    
+    issuer_names = issuer_names[issuer_names['name'].str.len() >= min_length]
+    return issuer_names.drop_duplicates().reset_index(drop=True)
+
+def build_issuer_automaton(issuer_names):
+    """
+    :param issuer_names: get_issuer_names DataFrame
+    :return: Aho-Corasick automaton of all names, each name giving the tuple of issuer codes it stands for
+    """
+    # pyahocorasick is only needed with issuer linking, the stage runs without it otherwise
+    import ahocorasick
+    name_dict = {}
+    for name, code in zip(issuer_names['name'], issuer_names['b_info_issuercode']):
+        name_dict.setdefault(name, []).append(code)
+    issuer_automaton = ahocorasick.Automaton()
+    for name, codes in name_dict.items():
+        issuer_automaton.add_word(name, tuple(codes))
+    issuer_automaton.make_automaton()
+    return issuer_automaton
+
+def link_issuers(titles, contents, issuer_automaton):
+    """
+    :param titles: FormatTitle of the news
+    :param contents: FormatContent of the news
+    :param issuer_automaton: build_issuer_automaton of the issuer names
+    :return: list of the issuer codes named in each news, in order of first appearance
+        --> One scan of each text whatever the number of names. Only the longest name is kept where names overlap,
+            e.g. the full name of a subsidiary is not also read as its parent's name
+    """
+    linked_issuercode = []
+    for title, content in zip(titles, contents):
+        # '\n' never appears in a name nor in the cleaned texts, no name is matched across title and content
+        codes = {}
+        for _, matched_codes in issuer_automaton.iter_long(str(title) + '\n' + str(content)):
+            codes.update(dict.fromkeys(matched_codes))
+        linked_issuercode.append(list(codes))
+    return linked_issuercode
+
+def get_news_issuercode(dataframe, bond_profile):
+    """
+    :param dataframe: bond related news with 's_info_windcode' and 'b_info_issuercode' lists
+    :param bond_profile: bond_profile DataFrame of those 4 bond groups
+    :return: list of each news's issuers, its 'b_info_issuercode' and the issuers of its 's_info_windcode' (as generate_default_labels extends them)
+    """
+    bond_issuercode = bond_profile[['s_info_windcode', 'b_info_issuercode']].dropna().astype(str).drop_duplicates()
+    bond_dict = bond_issuercode.set_index('s_info_windcode')['b_info_issuercode'].to_dict()
+    return [list(dict.fromkeys(list(issuercode) + [bond_dict[item] for item in windcode if item in bond_dict]))
+            for issuercode, windcode in zip(dataframe['b_info_issuercode'], dataframe['s_info_windcode'])]
+
+def bond_related_processing(dataframe, bond_code_index, config, issuer_automaton=None):
     """
     :param dataframe: Input DataFrame that need to construct two columns, 's_info_windcode' and 'b_info_issuercode'
-    :param s_info_windcode: s_info_windcode in 4 groups of bond
-    :param b_info_issuercode: b_info_issuercode in 4 groups of bond related issuers
+    :param bond_code_index: get_bond_code_index of bond_profile, the codes of 4 groups of bond and of their issuers
+    :param issuer_automaton: build_issuer_automaton of the issuer names, None to use the Windcodes tags only
     :return: DataFrame that include two columns, 's_info_windcode' and 'b_info_issuercode' including in those 4 bond groups ('Enterprise Bond', 'Commercial Paper', 'Corporate Bond', 'Medium Term Note')
+        --> With issuer_automaton, the issuers named in FormatTitle/FormatContent are added to 'b_info_issuercode' and listed in 'linked_issuercode',
+            news without Windcodes tags are kept when they name an issuer
     """
-    # Double check publishDate is in string format and change Windcodes from string to list
+    # Double check publishDate is in string format, Windcodes are loaded as lists by stage_io
     dataframe.publishDate = dataframe.publishDate.apply(lambda x: str(x))
-    dataframe.Windcodes = dataframe.Windcodes.apply(lambda x: eval(x))
     
-    # Drop rows that Windcodes == []
-    dataframe = dataframe.drop(dataframe[dataframe.Windcodes.apply(lambda x: len(x) == 0)].index).reset_index(drop=True)
+    # Drop rows that Windcodes == [], unless they are searched for issuer names
+    if issuer_automaton is None:
+        dataframe = dataframe[dataframe.Windcodes.str.len() > 0].reset_index(drop=True)
+    
+    # Split the ':' inside Windcodes, one row per code with the row number of its news as index
+    codes = dataframe.Windcodes.explode().dropna().astype(str).str.split(':').explode()
+    row, code = codes.index.to_numpy(), codes.to_numpy()
+    windcodes = [[] for _ in range(len(dataframe))]
+    for i, item in zip(row, code):
+        windcodes[i].append(item)
+    dataframe.Windcodes = windcodes
     
-    # Split the ':' inside Windcodes
-    dataframe.Windcodes = dataframe.Windcodes.apply(lambda x: [x[i].split(':') for i in range(len(x)) if len(x) > 0])
-    dataframe.Windcodes = dataframe.Windcodes.apply(lambda x: [item for sublist in x for item in sublist])
+    # Filter the 's_info_windcode' and 'b_info_issuercode' in those 4 bond groups: one hash lookup per code
+    position = bond_code_index.index.get_indexer(code)
+    is_bond_code = position >= 0
+    matched = pd.DataFrame({'row': row[is_bond_code], 'code': code[is_bond_code],
+                            'kind': bond_code_index.to_numpy()[position[is_bond_code]]}).drop_duplicates(['row', 'code'])
+    s_info_windcode = [[] for _ in range(len(dataframe))]
+    b_info_issuercode = [[] for _ in range(len(dataframe))]
+    for i, item, kind in zip(matched.row, matched.code, matched.kind):
+        if kind & 1:
+            s_info_windcode[i].append(item)
+        if kind & 2:
+            b_info_issuercode[i].append(item)
+    is_related = np.zeros(len(dataframe), dtype=bool)
+    is_related[matched.row.to_numpy()] = True
     
-    # Filter the 's_info_windcode' and 'b_info_issuercode' in those 4 bond groups
-    dataframe['s_info_windcode'] = dataframe.Windcodes.apply(lambda x: list(set(x) & set(s_info_windcode)))
-    dataframe['b_info_issuercode'] = dataframe.Windcodes.apply(lambda x: list(set(x) & set(b_info_issuercode)))
+    # Add the issuers named in the news
+    if issuer_automaton is not None:
+        linked_issuercode = link_issuers(dataframe.FormatTitle, dataframe.FormatContent, issuer_automaton)
+        for codes, linked_codes in zip(b_info_issuercode, linked_issuercode):
+            codes.extend([code for code in linked_codes if code not in codes])
+        dataframe['linked_issuercode'] = linked_issuercode
+        is_related |= np.array([len(codes) > 0 for codes in linked_issuercode], dtype=bool)
+    dataframe['s_info_windcode'] = s_info_windcode
+    dataframe['b_info_issuercode'] = b_info_issuercode
     
     # Filter out rows that contain 's_info_windcode' or 'b_info_issuercode'
-    dataframe = dataframe[dataframe.apply(lambda row: len(row['s_info_windcode'] + row['b_info_issuercode']) > 0, axis=1)].reset_index(drop=True)
+    dataframe = dataframe[is_related].reset_index(drop=True)
     
     # Save processed data
     publishdate = dataframe.publishDate[0]
-    save_file_name = str(publishdate) + '_listfilter_bond.csv'
-    if not os.path.exists(config.bond_related_output_dir):
-        os.makedirs(config.bond_related_output_dir)
-    dataframe.to_csv(os.path.join(config.bond_related_output_dir, save_file_name), index=False, encoding='utf_8_sig')
+    stage_io.write_stage_frame(dataframe, config.bond_related_output_dir, str(publishdate) + '_listfilter_bond', config.stage_format)
     
     return dataframe
@@ -1,7 +1,9 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_bond_related_news')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
 import os
+from pipeline_utils import shared_frame, stage_io, news_issuer_index
 from joblib import Parallel, delayed
 from bond_related_news_config import Bond_related_news_config
 import bond_related_news_processing
@@ -23,8 +25,8 @@ def generate_bond_related_news(data_date=None):
     
     # Load in second filter dataframe into a list
     second_filter = []
-    for file in os.listdir(second_filter_input_path):
-        date_secondfilter = pd.read_csv(os.path.join(second_filter_input_path, file))
+    for file_path in stage_io.list_stage_files(second_filter_input_path):
+        date_secondfilter = stage_io.read_stage_frame(file_path)
         if date_secondfilter.empty:
             continue
         else:
@@ -32,14 +34,43 @@ def generate_bond_related_news(data_date=None):
     
     # ----- Data Cleaning Processing ----- #
     ####################################################################################################################
-    # First get 's_info_windcode' and 'b_info_issuercode' list in those 4 bond groups ('Enterprise Bond', 'Commercial Paper', 'Corporate Bond', 'Medium Term Note')
-    s_info_windcode = list(bond_profile.s_info_windcode.unique())
-    b_info_issuercode = list(bond_profile.b_info_issuercode.unique())
+    # First index the 's_info_windcode' and 'b_info_issuercode' in those 4 bond groups ('Enterprise Bond', 'Commercial Paper', 'Corporate Bond', 'Medium Term Note'), once for all days
+    bond_code_index = bond_related_news_processing.get_bond_code_index(bond_profile)
+    
+    # Compile the issuer names (b_info_issuer, b_info_fullname and aliases) into one automaton, once for all days
+    issuer_automaton = None
+    if bond_related_news_config.issuer_linking:
+        issuer_names = bond_related_news_processing.get_issuer_names(bond_profile, bond_related_news_config.issuer_alias_path, bond_related_news_config.issuer_name_min_length)
+        issuer_automaton = bond_related_news_processing.build_issuer_automaton(issuer_names)
 
     # ----- Export ----- #
     ####################################################################################################################    
     # Get Bond related news inside those 4 bond groups and save them in csv files
-    Parallel(n_jobs=20)(delayed(bond_related_news_processing.bond_related_processing)(frame, s_info_windcode, b_info_issuercode, bond_related_news_config) for frame in second_filter)
+    if bond_related_news_config.shared_frames:
+        # The code index is published once for the stage, each day's news once, workers attach them from shared memory
+        shared_bond_code_index = shared_frame.publish_frame(bond_code_index, 'bond_code_index', cache=True)
+        shared_reference_list = [shared_bond_code_index]
+        shared_issuer_automaton = None
+        if issuer_automaton is not None:
+            shared_issuer_automaton = shared_frame.publish_frame(issuer_automaton, 'issuer_automaton', cache=True)
+            shared_reference_list.append(shared_issuer_automaton)
+        shared_second_filter = [shared_frame.publish_frame(frame, 'second_filter') for frame in second_filter]
+        try:
+            bond_related_news = Parallel(n_jobs=20)(delayed(shared_frame.run_with_shared)(bond_related_news_processing.bond_related_processing, frame, shared_bond_code_index, bond_related_news_config, shared_issuer_automaton) for frame in shared_second_filter)
+        finally:
+            shared_frame.release_frames(shared_reference_list + shared_second_filter)
+    else:
+        bond_related_news = Parallel(n_jobs=20)(delayed(bond_related_news_processing.bond_related_processing)(frame, bond_code_index, bond_related_news_config, issuer_automaton) for frame in second_filter)
+    
+    # Save the news <-> issuer inverted index of this month's bond related news, an empty index for a month without any
+    if bond_related_news_config.build_news_issuer_index:
+        bond_related_news = [frame for frame in bond_related_news if frame is not None and not frame.empty]
+        if len(bond_related_news) == 0:
+            index = news_issuer_index.build_news_issuer_index([], [])
+        else:
+            bond_related_news = pd.concat(bond_related_news)
+            index = news_issuer_index.build_news_issuer_index(bond_related_news.News_ID, bond_related_news_processing.get_news_issuercode(bond_related_news, bond_profile))
+        news_issuer_index.save_news_issuer_index(index, bond_related_news_config.news_issuer_index_dir)
 
 if __name__ == '__main__':
     generate_bond_related_news()
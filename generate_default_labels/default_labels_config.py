@@ -10,6 +10,7 @@ class Default_labels_config():
                 raise ValueError('No data at that date')
             data_version = data_date
         
+        self.data_version = data_version
         self.cbond_tables_dir = os.path.join(cbond_tables_dir, data_version)
         
         ### processed data
@@ -20,10 +21,30 @@ class Default_labels_config():
         bond_profile_input_dir = os.path.join(processed_date_dir, processing_version, 'features_data/bond_profile')
         
         default_labels_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/single_default_label')
+        news_issuer_index_dir = os.path.join(processed_date_dir, processing_version, 'features_data/news_issuer_index')
         
         self.bond_related_input_dir = os.path.join(bond_related_input_dir, data_version)
         self.bond_profile_input_dir = os.path.join(bond_profile_input_dir, data_version)
         self.default_labels_output_dir = os.path.join(default_labels_output_dir, data_version)
         
+        ### Hand the news frames and the bond references to the workers through shared memory (pipeline_utils.shared_frame)
+        ### instead of pickling them into every task
+        self.shared_frames = True
+        
+        ### Label the whole month at once with array comparisons (default_labels_processing.get_default_labels) instead of
+        ### one task per publishdate judging row by row with default_judge
+        self.vectorized_labels = True
+        
+        ### Format of the output files: 'parquet' keeps s_info_windcode / b_info_issuercode as lists, 'csv' writes them as reprs
+        self.stage_format = 'parquet'
+        
+        ### Incremental relabel (generate_default_labels.relabel_default_labels): the default dates of this version's bond_profile
+        ### are compared with the previous version's, and the labels of the earlier versions are rewritten only for the news
+        ### linked to the issuers whose default dates changed, found through their news_issuer_index
+        self.bond_profile_root_dir = bond_profile_input_dir
+        self.bond_related_root_dir = bond_related_input_dir
+        self.default_labels_root_dir = default_labels_output_dir
+        self.news_issuer_index_root_dir = news_issuer_index_dir
+        
 if __name__ == '__main__':
     config = Default_labels_config()
@@ -3,6 +3,7 @@ import os
 import numpy as np
 from dateutil.relativedelta import relativedelta
 from datetime import timedelta
+from pipeline_utils import stage_io
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -106,52 +107,242 @@ def get_default_frame(df, code, bond_profile, extendlist, backlist):
     
     return df
 
-def default_labels_processing(dataframe, bond_profile, extendlist, backlist, config):
+def get_period_end(publish_date, period):
+    """
+    :param publish_date: datetime64 Series of publishdates
+    :param period: time period as in default_judge, e.g. '12_months', '10_days', '2_weeks'
+    :return: datetime64 Series, end of the period started from each publishdate (months added as relativedelta does, day clipped to the month end)
+    """
+    number = int(period[:(period.index('_'))])
+    if period.endswith('months'):
+        return publish_date + pd.DateOffset(months=number)
+    elif period.endswith('days'):
+        return publish_date + pd.Timedelta(days=number)
+    elif period.endswith('weeks'):
+        return publish_date + pd.Timedelta(weeks=number)
+    raise ValueError(f'Unknown period: {period}')
+
+def get_default_labels(df, code, bond_profile, extendlist, backlist):
+    """
+    :param df: News DataFrame with News_ID, publishDate, single_news and the code list column
+    :param code: Which code used to judge default? ('s_info_windcode' or 'b_info_issuercode')
+    :param bond_profile: 4 groups bonds information DataFrame
+    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
+    :param backlist: Time periods that we want to use to judge default (Looking backward)
+    :return: DataFrame of News_ID and its default labels, same as get_default_frame computed with array comparisons
+    """
+    # Each (news, code) pair against every default date of the code
+    df = df[['News_ID', 'publishDate', 'single_news', code]].explode(code).reset_index(drop=True)
+    df = df.merge(bond_profile[[code, 'b_default_date']].drop_duplicates().reset_index(drop=True), on=[code], how='left')
+    publish_date = pd.to_datetime(df['publishDate'], format='%Y%m%d')
+    default_date = pd.to_datetime(df['b_default_date'], format='%Y%m%d')
+    
+    # Looking Forward: -1 when the default date is after publishdate and within the period
+    for period in extendlist:
+        df[period] = np.where((default_date > publish_date) & (default_date <= get_period_end(publish_date, period)), -1, 1)
+    # Looking Backward: -1 when the default date is not after publishdate, for news related to only one issuercode
+    for period in backlist:
+        df[period] = np.where((default_date <= publish_date) & (df['single_news'] == 1), -1, 1)
+    
+    # A news is labelled -1 in a period when any of its codes is, i.e. the min of the labels
+    return df.groupby('News_ID', sort=False)[extendlist + backlist].min().reset_index()
+
+def build_default_date_index(bond_profile, code):
+    """
+    :param bond_profile: 4 groups bonds information DataFrame
+    :param code: 's_info_windcode' or 'b_info_issuercode'
+    :return: dict of the default dates of each code:
+        'codes': Index of the codes with default records, the position of a code is its integer id
+        'indptr': the default dates of code id i are dates[indptr[i]:indptr[i + 1]]
+        'dates': datetime64[D] default dates, sorted within each code
+        'keys': int64 (code id << 32) + day number of each date, sorted, to search a (code, date) pair in one searchsorted
+    """
+    default_dates = bond_profile[[code, 'b_default_date']].dropna().drop_duplicates()
+    default_dates = pd.DataFrame({code: default_dates[code].astype(str).to_numpy(),
+                                  'b_default_date': pd.to_datetime(default_dates['b_default_date'], format='%Y%m%d').to_numpy()})
+    code_id, codes = pd.factorize(default_dates[code])
+    dates = default_dates['b_default_date'].to_numpy().astype('datetime64[D]')
+    order = np.lexsort((dates, code_id))
+    code_id, dates = code_id[order], dates[order]
+    indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(code_id, minlength=len(codes)), out=indptr[1:])
+    keys = (code_id.astype(np.int64) << 32) + (dates.astype(np.int64) + 2 ** 31)
+    # Build the hash table of the codes now, it is kept with the index for the whole run
+    codes.get_indexer(codes[:1])
+    return {'codes': codes, 'indptr': indptr, 'dates': dates, 'keys': keys}
+
+def get_indexed_default_labels(df, code, default_date_index, extendlist, backlist):
+    """
+    :param df: News DataFrame with News_ID, publishDate, single_news and the code list column
+    :param code: Which code used to judge default? ('s_info_windcode' or 'b_info_issuercode')
+    :param default_date_index: build_default_date_index of the code
+    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
+    :param backlist: Time periods that we want to use to judge default (Looking backward)
+    :return: DataFrame of News_ID and its default labels, same as get_default_labels without joining the default dates
+        --> One searchsorted per (news, code) pair: the first default date after publishdate decides every forward period,
+            the first default date of the code decides the backward label
+    """
+    codes = df[code].explode()
+    row = codes.index.to_numpy()
+    code_id = default_date_index['codes'].get_indexer(codes.astype(str).to_numpy())
+    has_default = (code_id >= 0) & codes.notnull().to_numpy()
+    row, code_id = row[has_default], code_id[has_default]
+    
+    publish_date = pd.to_datetime(df['publishDate'], format='%Y%m%d')
+    news_day = publish_date.to_numpy().astype('datetime64[D]')
+    # First default date of the code strictly after publishdate, if any
+    position = np.searchsorted(default_date_index['keys'], (code_id.astype(np.int64) << 32) + (news_day[row].astype(np.int64) + 2 ** 31), side='right')
+    has_next = position < default_date_index['indptr'][code_id + 1]
+    next_date = default_date_index['dates'][np.minimum(position, len(default_date_index['dates']) - 1)]
+    first_date = default_date_index['dates'][default_date_index['indptr'][code_id]]
+    
+    labels = pd.DataFrame({'News_ID': df['News_ID'].to_numpy()})
+    # A news is labelled -1 in a period when any of its codes is, i.e. the min of the labels
+    for period in extendlist:
+        period_end = get_period_end(publish_date, period).to_numpy().astype('datetime64[D]')
+        label = np.ones(len(df), dtype=np.int64)
+        np.minimum.at(label, row, np.where(has_next & (next_date <= period_end[row]), -1, 1))
+        labels[period] = label
+    for period in backlist:
+        label = np.ones(len(df), dtype=np.int64)
+        np.minimum.at(label, row, np.where((first_date <= news_day[row]) & (df['single_news'].to_numpy()[row] == 1), -1, 1))
+        labels[period] = label
+    
+    return labels.groupby('News_ID', sort=False)[extendlist + backlist].min().reset_index()
+
+def extend_issuercode(dataframe, bond_profile):
     '''
     :param dataframe: DataFrame that waiting for label default judgement
     :param bond_profile: Bond information DataFrame used to extend 'b_info_issuercode' using 's_info_windcode'
-    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
-    :param backlist: Time periods that we want to use to judge default (Looking backward)
-    :param config: Files' path
-    :return: DataFrame labeled with default after judgement
+    :return: DataFrame with the issuers of its 's_info_windcode' added to 'b_info_issuercode' and the 'single_news' label
     '''
     # Use bond_profile to find each news's 's_info_windcode' and then extend the related 'b_info_issuercode' into 'b_info_issuercode' list
     bond_issuercode = bond_profile[['s_info_windcode', 'b_info_issuercode']].drop_duplicates().reset_index(drop=True)
     bond_dict = bond_issuercode.set_index('s_info_windcode')['b_info_issuercode'].to_dict()
-    dataframe['b_info_issuercode'] = dataframe.apply(lambda x: list(set(eval(x['b_info_issuercode'])).union(set([bond_dict.get(item, item) for item in eval(x['s_info_windcode'])]))), axis=1)
+    dataframe['b_info_issuercode'] = [list(set(issuercode).union(set([bond_dict.get(item, item) for item in windcode])))
+                                      for issuercode, windcode in zip(dataframe['b_info_issuercode'], dataframe['s_info_windcode'])]
     
     # Label whether the news only related to one issuercode after extend. 1 for single news, 0 for not single news
-    dataframe['single_news'] = dataframe.apply(lambda x: 1 if len(x['b_info_issuercode']) == 1 else 0, axis=1)
+    dataframe['single_news'] = (dataframe['b_info_issuercode'].str.len() == 1).astype(np.int64)
     
-    # Switch 's_info_windcode' and 'b_info_issuercode' to string to judge whether they are empty and also choose which code to use for the judgement
-    dataframe['s_info_windcode'] = dataframe['s_info_windcode'].apply(lambda x: str(x))
-    dataframe['b_info_issuercode'] = dataframe['b_info_issuercode'].apply(lambda x: str(x))
+    return dataframe
+
+def label_news_defaults(dataframe, bond_profile, extendlist, backlist, get_labels=get_default_labels, default_date_index=None):
+    '''
+    :param dataframe: DataFrame that waiting for label default judgement, one day or a whole month
+    :param bond_profile: Bond information DataFrame used to extend 'b_info_issuercode' using 's_info_windcode'
+    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
+    :param backlist: Time periods that we want to use to judge default (Looking backward)
+    :param get_labels: function giving the labels of each News_ID by one code (get_default_labels, or get_default_frame row by row)
+    :param default_date_index: dict of build_default_date_index by code, looked up by get_indexed_default_labels instead of get_labels
+    :return: DataFrame labeled with default after judgement
+    '''
+    if default_date_index is not None:
+        get_labels = lambda df, code, bond_profile, extendlist, backlist: get_indexed_default_labels(df, code, default_date_index[code], extendlist, backlist)
+    dataframe = extend_issuercode(dataframe, bond_profile)
+    
+    # Judge whether 's_info_windcode' and 'b_info_issuercode' lists are empty to choose which code to use for the judgement
+    windcode_num = dataframe['s_info_windcode'].str.len()
+    issuercode_num = dataframe['b_info_issuercode'].str.len()
     
     # Split the DataFrame into two parts, whether the 's_info_windcode' is empty or not
     overall_dataframe = [] # waiting to concat the DataFrame after filtering
     # If 's_info_windcode' is not empty, we use it to judge default label
-    windcode_notempty = dataframe[dataframe['s_info_windcode'] != '[]'].reset_index(drop=True)
+    windcode_notempty = dataframe[windcode_num > 0].reset_index(drop=True)
     if windcode_notempty.empty:
         pass
     else:
-        windcode_notempty = get_default_frame(windcode_notempty, 's_info_windcode', bond_profile, extendlist, backlist)
+        windcode_notempty = get_labels(windcode_notempty, 's_info_windcode', bond_profile, extendlist, backlist)
         overall_dataframe.append(windcode_notempty)
     # If 's_info_windcode' is empty, we use 'b_info_issuercode' to judge default label
-    windcode_empty = dataframe[(dataframe['s_info_windcode'] == '[]') & (dataframe['b_info_issuercode'] != '[]')].reset_index(drop=True)
+    windcode_empty = dataframe[(windcode_num == 0) & (issuercode_num > 0)].reset_index(drop=True)
     if windcode_empty.empty:
         pass
     else:
-        windcode_empty = get_default_frame(windcode_empty, 'b_info_issuercode', bond_profile, extendlist, backlist)
+        windcode_empty = get_labels(windcode_empty, 'b_info_issuercode', bond_profile, extendlist, backlist)
         overall_dataframe.append(windcode_empty)
     result = pd.concat(overall_dataframe).reset_index(drop=True)
     result = result[['News_ID', 'last_12month', '12_months', '3_months', '1_months']]
     finaloutput = pd.merge(dataframe, result, on=['News_ID'], how='left')
     
+    return finaloutput
+
+def save_default_labels(dataframe, config):
+    '''
+    :param dataframe: one publishdate's DataFrame labeled with default
+    :param config: Files' path
+    :return: the same DataFrame
+    '''
+    publishdate = dataframe.publishDate.iloc[0]
+    stage_io.write_stage_frame(dataframe, config.default_labels_output_dir, str(publishdate) + '_listfilter_bond', config.stage_format)
+    
+    return dataframe
+
+def get_changed_default_issuers(bond_profile, previous_bond_profile):
+    '''
+    :param bond_profile: Bond information DataFrame of this data version
+    :param previous_bond_profile: Bond information DataFrame of the previous data version
+    :return: List of the 'b_info_issuercode' whose bonds' default dates differ between the two versions (added, removed or moved)
+        --> Only the news linked to these issuers can get other default labels
+    '''
+    default_records = []
+    for profile in [bond_profile, previous_bond_profile]:
+        records = profile[['s_info_windcode', 'b_info_issuercode', 'b_default_date']].dropna()
+        # b_default_date is a float or an Int32 YYYYMMDD depending on the table schema of the version
+        default_records.append(pd.DataFrame({'s_info_windcode': records['s_info_windcode'].astype(str).to_numpy(),
+                                             'b_info_issuercode': records['b_info_issuercode'].astype(str).to_numpy(),
+                                             'b_default_date': records['b_default_date'].astype(np.int64).to_numpy()}).drop_duplicates())
+    default_records = default_records[0].merge(default_records[1], how='outer', indicator=True)
+    
+    return sorted(default_records.loc[default_records['_merge'] != 'both', 'b_info_issuercode'].unique())
+
+def relabel_default_labels_file(label_path, bond_related_path, news_ids, bond_profile, extendlist, backlist, default_date_index=None):
+    '''
+    :param label_path: single_default_label file of one publishdate
+    :param bond_related_path: bond_related_news file of the same publishdate, the input the labels were made from
+    :param news_ids: Set of the News_ID whose labels may have changed
+    :param bond_profile: Bond information DataFrame holding the new default dates
+    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
+    :param backlist: Time periods that we want to use to judge default (Looking backward)
+    :param default_date_index: dict of build_default_date_index by code of bond_profile
+    :return: publishDate of the file if some labels changed and the file was rewritten, None otherwise
+        --> Only the rows of news_ids are labelled again, the other rows and columns of the file are kept as they are
+    '''
+    labeled_news = stage_io.read_stage_frame(label_path)
+    is_affected = labeled_news['News_ID'].astype(str).isin(news_ids).to_numpy()
+    if not is_affected.any():
+        return None
+    
+    bond_related_news = stage_io.read_stage_frame(bond_related_path)
+    bond_related_news = bond_related_news[bond_related_news['News_ID'].astype(str).isin(news_ids)].reset_index(drop=True)
+    relabeled_news = label_news_defaults(bond_related_news, bond_profile, extendlist, backlist, default_date_index=default_date_index)
+    relabeled_news = relabeled_news.drop_duplicates('News_ID')
+    relabeled_news.index = relabeled_news['News_ID'].astype(str)
+    
+    label_columns = extendlist + backlist
+    old_labels = labeled_news.loc[is_affected, label_columns]
+    new_labels = relabeled_news[label_columns].reindex(labeled_news.loc[is_affected, 'News_ID'].astype(str)).set_axis(old_labels.index)
+    new_labels = new_labels.fillna(old_labels).astype(old_labels.dtypes.to_dict())
+    if new_labels.equals(old_labels):
+        return None
+    
+    labeled_news.loc[is_affected, label_columns] = new_labels
+    stage_io.write_stage_frame(labeled_news, os.path.dirname(label_path), stage_io.get_file_stem(label_path), stage_io.get_stage_format(label_path))
+    
+    return labeled_news.publishDate.iloc[0]
+
+def default_labels_processing(dataframe, bond_profile, extendlist, backlist, config):
+    '''
+    :param dataframe: DataFrame that waiting for label default judgement
+    :param bond_profile: Bond information DataFrame used to extend 'b_info_issuercode' using 's_info_windcode'
+    :param extendlist: Time periods that we want to use to judge default (Looking ahead)
+    :param backlist: Time periods that we want to use to judge default (Looking backward)
+    :param config: Files' path
+    :return: DataFrame labeled with default after judgement, row by row with default_judge
+    '''
+    finaloutput = label_news_defaults(dataframe, bond_profile, extendlist, backlist, get_labels=get_default_frame)
+    
     # Save processed data
-    publishdate = finaloutput.publishDate[0]
-    save_file_name = str(publishdate) + '_listfilter_bond.csv'
-    if not os.path.exists(config.default_labels_output_dir):
-        os.makedirs(config.default_labels_output_dir)
-    finaloutput.to_csv(os.path.join(config.default_labels_output_dir, save_file_name), index=False, encoding='utf_8_sig')
+    save_default_labels(finaloutput, config)
     
     return finaloutput
@@ -1,7 +1,9 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_default_labels')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
 import os
+from pipeline_utils import shared_frame, stage_io, news_issuer_index
 from joblib import Parallel, delayed
 from default_labels_config import Default_labels_config
 import default_labels_processing
@@ -24,6 +26,10 @@ Default labels logistic:
         b) Backward: We check whether there are default records before news's publishdate or not.
 '''
 
+# Set different time periods that we want to consider the default labels
+extendList = ['12_months', '3_months', '1_months'] # We want to label the default records within 12 months, 3 months, 1 months started from news's publishdate, respectively
+backList = ['last_12month'] # We want to label each news's default record before publishdate, no matter how long it is. ('last_12month' here does not mean we just look backward for 12 months, but all previous periods)
+
 def generate_default_labels(data_date=None):
     default_labels_config = Default_labels_config(data_date=data_date)
     
@@ -37,21 +43,96 @@ def generate_default_labels(data_date=None):
     
     # Load in bond related news dataframe into a list
     bond_related_news = []
-    for file in os.listdir(bond_related_input_path):
-        data_bond_related = pd.read_csv(os.path.join(bond_related_input_path, file))
+    for file_path in stage_io.list_stage_files(bond_related_input_path):
+        data_bond_related = stage_io.read_stage_frame(file_path)
         bond_related_news.append(data_bond_related)
     
+    # ----- Export ----- #
+    ####################################################################################################################
+    # Get Bond related news with Default labels and save them in csv files
+    if default_labels_config.vectorized_labels:
+        # The whole month is labelled in one call with array comparisons, then each publishdate is saved
+        # Default dates are indexed once by code, each (news, code) pair is then a searchsorted without joining bond_profile
+        bond_related_news = [frame for frame in bond_related_news if not frame.empty]
+        if len(bond_related_news) == 0:
+            pass
+        else:
+            default_date_index = {code: default_labels_processing.build_default_date_index(bond_profile, code) for code in ['s_info_windcode', 'b_info_issuercode']}
+            default_labeled_news = default_labels_processing.label_news_defaults(pd.concat(bond_related_news, ignore_index=True), bond_profile, extendList, backList, default_date_index=default_date_index)
+            Parallel(n_jobs=20, backend='threading')(delayed(default_labels_processing.save_default_labels)(frame.reset_index(drop=True), default_labels_config) for _, frame in default_labeled_news.groupby('publishDate', sort=False))
+    elif default_labels_config.shared_frames:
+        # bond_profile is published once for the stage, each day's news once, workers attach them from shared memory
+        shared_bond_profile = shared_frame.publish_frame(bond_profile, 'bond_profile', cache=True)
+        shared_bond_related_news = [shared_frame.publish_frame(frame, 'bond_related_news') for frame in bond_related_news]
+        try:
+            Parallel(n_jobs=20)(delayed(shared_frame.run_with_shared)(default_labels_processing.default_labels_processing, frame, shared_bond_profile, extendList, backList, default_labels_config) for frame in shared_bond_related_news)
+        finally:
+            shared_frame.release_frames([shared_bond_profile] + shared_bond_related_news)
+    else:
+        Parallel(n_jobs=20)(delayed(default_labels_processing.default_labels_processing)(frame, bond_profile, extendList, backList, default_labels_config) for frame in bond_related_news)
+
+def relabel_default_labels(data_date=None, previous_date=None):
+    '''
+    Incremental relabel: the forward labels of old news change when a later version of CBONDDEFAULTREPORTFORM gains defaults.
+    Instead of running generate_default_labels again for every earlier version, only the news linked to the issuers whose
+    default dates changed since the previous version are labelled again, with this version's default dates.
+    :param data_date: Data version holding the new default dates, its own news are labelled by generate_default_labels
+    :param previous_date: Data version to compare the default dates with, None for the latest version before data_date
+    :return: (data_version, relabeled_dict): the data version holding the new default dates (data_date, or the latest version
+        when data_date is None), and dict of each earlier data version and the list of its publishdates whose labels were rewritten
+        --> generate_news_jiebascore(data_date=version, publish_dates=...) and generate_panel_table(data_date=version,
+            bond_profile_date=data_version) then update the downstream files
+    '''
+    default_labels_config = Default_labels_config(data_date=data_date)
+    data_version = default_labels_config.data_version
+    
+    # ----- Load Data in Use ----- #
+    ####################################################################################################################
+    bond_profile = pd.read_pickle(os.path.join(default_labels_config.bond_profile_input_dir, 'bond_profile.pkl'))
+    if previous_date is None:
+        previous_versions = [version for version in sorted(os.listdir(default_labels_config.bond_profile_root_dir)) if version < data_version]
+        if len(previous_versions) == 0:
+            return data_version, {}
+        previous_date = previous_versions[-1]
+    previous_bond_profile = pd.read_pickle(os.path.join(default_labels_config.bond_profile_root_dir, previous_date, 'bond_profile.pkl'))
+    
     # ----- Data Cleaning Processing ----- #
     ####################################################################################################################
-   
-    # Set different time periods that we want to consider the default labels
-    extendList = ['12_months', '3_months', '1_months'] # We want to label the default records within 12 months, 3 months, 1 months started from news's publishdate, respectively
-    backList = ['last_12month'] # We want to label each news's default record before publishdate, no matter how long it is. ('last_12month' here does not mean we just look backward for 12 months, but all previous periods)
+    
+    # Issuers whose bonds' default dates were added, removed or moved since the previous version
+    changed_issuercode = default_labels_processing.get_changed_default_issuers(bond_profile, previous_bond_profile)
+    if len(changed_issuercode) == 0:
+        return data_version, {}
+    default_date_index = {code: default_labels_processing.build_default_date_index(bond_profile, code) for code in ['s_info_windcode', 'b_info_issuercode']}
     
     # ----- Export ----- #
     ####################################################################################################################
-    # Get Bond related news with Default labels and save them in csv files
-    Parallel(n_jobs=20)(delayed(default_labels_processing.default_labels_processing)(frame, bond_profile, extendList, backList, default_labels_config) for frame in bond_related_news)
+    relabeled_dict = {}
+    for version in sorted(os.listdir(default_labels_config.default_labels_root_dir)):
+        if version >= data_version:
+            continue
+        label_paths = stage_io.list_stage_files(os.path.join(default_labels_config.default_labels_root_dir, version))
+        
+        # News linked to the changed issuers, through the version's news_issuer_index. Versions made before the index existed
+        # get it from their label files, whose 'b_info_issuercode' already holds the issuers of 's_info_windcode'
+        index_dir = os.path.join(default_labels_config.news_issuer_index_root_dir, version)
+        if os.path.exists(os.path.join(index_dir, news_issuer_index.INDEX_ARRAY_LIST[0] + '.npy')):
+            index = news_issuer_index.load_news_issuer_index(index_dir)
+        else:
+            labeled_news = pd.concat([stage_io.read_stage_frame(path, columns=['News_ID', 'b_info_issuercode']) for path in label_paths], ignore_index=True)
+            index = news_issuer_index.build_news_issuer_index(labeled_news['News_ID'], labeled_news['b_info_issuercode'])
+        news_ids = set(news_issuer_index.get_issuers_news(index, changed_issuercode))
+        if len(news_ids) == 0:
+            continue
+        
+        # Only the publishdates holding those news are read and rewritten
+        bond_related_path_dict = {stage_io.get_file_stem(path): path for path in stage_io.list_stage_files(os.path.join(default_labels_config.bond_related_root_dir, version))}
+        publish_dates = Parallel(n_jobs=20, backend='threading')(delayed(default_labels_processing.relabel_default_labels_file)(path, bond_related_path_dict[stage_io.get_file_stem(path)], news_ids, bond_profile, extendList, backList, default_date_index) for path in label_paths if stage_io.get_file_stem(path) in bond_related_path_dict)
+        publish_dates = sorted(str(publishdate) for publishdate in publish_dates if publishdate is not None)
+        if len(publish_dates) > 0:
+            relabeled_dict[version] = publish_dates
+    
+    return data_version, relabeled_dict
 
 if __name__ == '__main__':
     generate_default_labels()
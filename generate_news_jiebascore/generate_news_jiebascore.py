@@ -1,7 +1,9 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_news_jiebascore')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
 import os
+from pipeline_utils import stage_io
 from joblib import Parallel, delayed
 from news_jiebascore_config import News_jiebascore_config
 import news_jiebascore_processing
@@ -10,8 +12,18 @@ import warnings
 warnings.filterwarnings("ignore")
 
 
-def generate_news_jiebascore(data_date=None):
+def generate_news_jiebascore(data_date=None, publish_dates=None):
+    '''
+    :param data_date: Data version
+    :param publish_dates: None to score the whole month, or the publishdates relabelled by generate_default_labels.relabel_default_labels:
+        only their label files are scored again and their rows replace those of the month's jieba score file
+        --> Scores are normalized day by day, the other days' rows do not change. Without a jieba score file for the month,
+            the whole month is scored
+    '''
     news_jiebascore_config = News_jiebascore_config(data_date=data_date)
+    jieba_score_output_dir = news_jiebascore_config.jieba_score_output_dir
+    if publish_dates is not None and not (os.path.isdir(jieba_score_output_dir) and len(stage_io.list_stage_files(jieba_score_output_dir)) > 0):
+        publish_dates = None
     
     # ----- Load Data in Use ----- #
     ####################################################################################################################
@@ -23,8 +35,10 @@ def generate_news_jiebascore(data_date=None):
     
     # Load in news dataframe with default labels
     default_labeled_news = []
-    for file in os.listdir(default_labels_input_path):
-        data_default_label = pd.read_csv(os.path.join(default_labels_input_path, file))
+    for file_path in stage_io.list_stage_files(default_labels_input_path):
+        if publish_dates is not None and stage_io.get_file_stem(file_path).split('_')[0] not in publish_dates:
+            continue
+        data_default_label = stage_io.read_stage_frame(file_path)
         default_labeled_news.append(data_default_label)
     
     # ----- Data Cleaning Processing ----- #
@@ -54,15 +68,22 @@ def generate_news_jiebascore(data_date=None):
             else:
                 waitingoutput.append(df)
     
+    if publish_dates is not None:
+        # Keep the rows of the other days from the month's file, the relabelled days may now have no rows left
+        jieba_score_path = stage_io.list_stage_files(jieba_score_output_path)[0]
+        df_jiebascore = stage_io.read_stage_frame(jieba_score_path)
+        df_jiebascore = df_jiebascore[~df_jiebascore['publishDate'].astype(str).isin(publish_dates)]
+        newsmonth = stage_io.get_file_stem(jieba_score_path)[:6]
+        df_jiebascore = pd.concat([df_jiebascore] + waitingoutput).sort_values('publishDate', kind='stable').reset_index(drop=True)
+        stage_io.write_stage_frame(df_jiebascore, jieba_score_output_path, newsmonth + '_jieba_score', news_jiebascore_config.stage_format)
+        return
+    
     # Concat the DataFrame in the list into a whole DataFrame table
     df_jiebascore = pd.concat(waitingoutput).reset_index(drop=True)
     
     # Save processed data
     newsmonth = str(df_jiebascore['publishDate'][0])[:6]
-    save_file_name = newsmonth + '_jieba_score.csv'
-    if not os.path.exists(jieba_score_output_path):
-        os.makedirs(jieba_score_output_path)
-    df_jiebascore.to_csv(os.path.join(jieba_score_output_path, save_file_name), index=False, encoding='utf_8_sig')
+    stage_io.write_stage_frame(df_jiebascore, jieba_score_output_path, newsmonth + '_jieba_score', news_jiebascore_config.stage_format)
 
 if __name__ == '__main__':
     generate_news_jiebascore()
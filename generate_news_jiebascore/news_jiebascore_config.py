@@ -23,5 +23,8 @@ class News_jiebascore_config():
         self.default_labels_input_dir = os.path.join(default_labels_input_dir, data_version)
         self.jieba_score_output_dir = os.path.join(jieba_score_output_dir, data_version)
         
+        ### Format of the output files: 'parquet' keeps s_info_windcode / b_info_issuercode as lists, 'csv' writes them as reprs
+        self.stage_format = 'parquet'
+        
 if __name__ == '__main__':
     config = News_jiebascore_config()
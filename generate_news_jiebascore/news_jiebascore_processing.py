@@ -105,8 +105,7 @@ def news_jiebascore_processing(dataframe, onepointlist, twopointlist, threepoint
             # Calculate News's jieba default score
             dataframe['jieba_score'] = dataframe.apply(lambda x: jieba_score(x['FormatTitle'], x['FormatContent'], onepointlist, twopointlist, threepointlist, fourpointlist, fivepointlist, filepath_stopwords)[0], axis=1)
             
-            # Divided jieba default score by b_info_issuercode number
-            dataframe['b_info_issuercode'] = dataframe['b_info_issuercode'].apply(lambda x: eval(x) if type(x) == str else x)
+            # Divided jieba default score by b_info_issuercode number (b_info_issuercode is loaded as lists by stage_io)
             dataframe['jieba_score_div_lenissuer'] = dataframe.apply(lambda x: x['jieba_score']/len(x['b_info_issuercode']) if len(x['b_info_issuercode']) != 0 else x['jieba_score'], axis=1)
             
             # Normalized jieba default score
@@ -0,0 +1,77 @@
+import sys
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_origin_news')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/get_data_from_mysql')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from local_wds import make_bond_tables, make_financialnews_chunk
+import origin_news_processing
+
+
+def financialnews_preprocess_rowwise(financialnews):
+    """
+    :param financialnews: Raw Financialnews DataFrame
+    :return: filtered financialnews table, computed row by row as financialnews_preprocess did before vectorizing
+    """
+    financialnews = financialnews[(financialnews.publishdate.notnull()) & (financialnews.title.notnull()) & (financialnews.content.notnull())].reset_index(drop=True)
+    financialnews['publish_date'] = financialnews.publishdate.apply(lambda x: str(x)[:10].replace('-',''))
+    financialnews['publish_time'] = financialnews.publishdate.apply(lambda x: str(x)[11:19])
+    split_label_list = ['windcodes', 'source', 'sections', 'areacodes', 'industrycodes', 'mktsentiments', 'newslevels']
+    for label in split_label_list:
+        financialnews[label] = financialnews[label].apply(lambda x: origin_news_processing.split_labels(x))
+    financialnews = financialnews.reset_index()
+    financialnews['index'] = financialnews['index'] + 1
+    financialnews['News_ID'] = financialnews.apply(lambda x: x['publish_date'][:6]+str(x['index']).zfill(6)+x['publish_date']+x['publish_time'][:2], axis=1)
+    financialnews = financialnews[['News_ID','publish_date','publish_time','title','content'] + split_label_list]
+    financialnews.columns = ['News_ID','publishDate','publishTime','Title','Content','Windcodes','Source','Sections','Areacodes','Industrycodes','Mktsentiments','Newslevels']
+    return financialnews
+
+
+def make_financialnews(num_rows, seed=0):
+    """
+    :param num_rows: Number of news
+    :param seed: Random seed
+    :return: Synthetic FINANCIALNEWS as loaded by generate_origin_news (lower case columns, datetime publishdate)
+    """
+    rng = np.random.default_rng(seed)
+    _, windcode, issuercode, issuer = make_bond_tables({'CBONDDESCRIPTIONZL': 10000, 'CBONDISSUERZL': 1,
+                                                        'CBONDINDUSTRYWINDZL': 1, 'CBONDDEFAULTREPORTFORM': 1}, rng)
+    financialnews = make_financialnews_chunk(0, num_rows, windcode, issuercode, issuer, '2024-02-01', '2024-03-01', rng)
+    financialnews.columns = financialnews.columns.str.lower()
+    financialnews['publishdate'] = pd.to_datetime(financialnews['publishdate'])
+    # Some news miss their title or labels, as in WDS
+    financialnews.loc[rng.random(num_rows) < 0.01, 'title'] = None
+    financialnews.loc[rng.random(num_rows) < 0.2, 'source'] = None
+    return financialnews
+
+
+def run_preprocess_benchmark(num_rows=200000, seed=0):
+    """
+    :param num_rows: Number of synthetic news
+    :param seed: Random seed
+    :return: Dict of seconds of the row by row and the vectorized preprocess, after checking both give the same table
+    """
+    financialnews = make_financialnews(num_rows, seed)
+
+    start_time = time.time()
+    rowwise = financialnews_preprocess_rowwise(financialnews.copy())
+    rowwise_seconds = time.time() - start_time
+
+    start_time = time.time()
+    vectorized = origin_news_processing.financialnews_preprocess(financialnews.copy())
+    vectorized_seconds = time.time() - start_time
+
+    pd.testing.assert_frame_equal(rowwise, vectorized)
+
+    return {'rows': num_rows, 'rowwise_seconds': round(rowwise_seconds, 2),
+            'vectorized_seconds': round(vectorized_seconds, 2), 'speedup': round(rowwise_seconds / vectorized_seconds, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='financialnews_preprocess row by row vs vectorized')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(run_preprocess_benchmark(args.rows))
@@ -1,6 +1,8 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_origin_news')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
+from pipeline_utils import snapshot_io
 import os
 from joblib import Parallel, delayed
 from origin_news_config import Origin_news_config
@@ -20,23 +22,31 @@ def generate_origin_news(data_date=None):
     split_publishdate_output_path = origin_news_config.split_publishdate_output_dir
     second_filter_output_path = origin_news_config.second_filter_output_dir
     
-    financialnews = pd.read_pickle(os.path.join(input_path, 'financialnews.pkl.gz'))
+    financialnews = snapshot_io.read_snapshot_table(input_path, 'financialnews', columns=origin_news_config.financialnews_cols)
     
     # ----- Data Cleaning Processing ----- #
     ####################################################################################################################
     # First clean the original financialnews data
     financialnews = origin_news_processing.financialnews_preprocess(financialnews)
     
-    # Split data by publishdate into a list, each element in the list will be a dataframe
-    publishdate_list = list(financialnews.publishDate.unique())
-    if not os.path.exists(split_publishdate_output_path):
-        os.makedirs(split_publishdate_output_path)
-    splitted_financialnews = Parallel(n_jobs=20, backend='threading')(delayed(origin_news_processing.split_publishdate)(financialnews, publish_date, origin_news_config) for publish_date in publishdate_list)
+    # Split data by publishdate into a list, each element in the list will be a dataframe.
+    # Only needed to save the split files or for the second filter of each publishdate, second_filter_month splits by itself
+    if origin_news_config.save_split_publishdate or not origin_news_config.month_dedup:
+        splitted_financialnews = origin_news_processing.split_publishdate(financialnews)
+    if origin_news_config.save_split_publishdate:
+        if not os.path.exists(split_publishdate_output_path):
+            os.makedirs(split_publishdate_output_path)
+        Parallel(n_jobs=20, backend='threading')(delayed(origin_news_processing.save_split_publishdate)(frame, origin_news_config) for frame in splitted_financialnews)
     
     # Complete second filter steps: Drop empty Title and Content; Delete HTML signs ...
     if not os.path.exists(second_filter_output_path):
         os.makedirs(second_filter_output_path)
-    Parallel(n_jobs=20)(delayed(origin_news_processing.second_filter)(frame, origin_news_config) for frame in splitted_financialnews)
+    if origin_news_config.month_dedup:
+        # Repeated news are dropped over the whole month, then each publishdate is saved
+        second_filter_financialnews = origin_news_processing.second_filter_month(financialnews, origin_news_config, n_jobs=20)
+        Parallel(n_jobs=20, backend='threading')(delayed(origin_news_processing.save_second_filter)(frame, origin_news_config) for frame in second_filter_financialnews)
+    else:
+        Parallel(n_jobs=20)(delayed(origin_news_processing.second_filter)(frame, origin_news_config) for frame in splitted_financialnews)
     
     # ----- Export ----- #
     ####################################################################################################################
@@ -1,4 +1,5 @@
 import os
+from pipeline_utils.column_manifest import get_stage_columns
 
 class Origin_news_config():
     def __init__(self, data_date=None):
@@ -10,8 +11,12 @@ class Origin_news_config():
                 raise ValueError('No data at that date')
             data_version = data_date
         
+        self.data_version = data_version
         self.cbond_tables_dir = os.path.join(cbond_tables_dir, data_version)
         
+        ### Raw columns in use (declared in pipeline_utils.column_manifest, only these columns are extracted and loaded)
+        self.financialnews_cols = get_stage_columns('generate_origin_news', 'financialnews')
+        
         ### processed data
         processed_date_dir = '/mnt/utnfs/data/sentiment_score_pipeline/data/processed_data'
         processing_version = os.path.abspath(os.path.join(os.getcwd(), os.pardir)).split('/')[-1]
@@ -19,13 +24,45 @@ class Origin_news_config():
         origin_news_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/origin_news')
         split_publishdate_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/split_publishdate')
         second_filter_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/second_filter')
+        news_clusters_output_dir = os.path.join(processed_date_dir, processing_version, 'features_data/news_clusters')
+        # Kept over all data versions, not one folder per version
+        self.seen_content_dir = os.path.join(processed_date_dir, processing_version, 'features_data/seen_content')
         
         self.origin_news_output_dir = os.path.join(origin_news_output_dir, data_version)
         self.split_publishdate_output_dir = os.path.join(split_publishdate_output_dir, data_version)
         self.second_filter_output_dir = os.path.join(second_filter_output_dir, data_version)
+        self.news_clusters_output_dir = os.path.join(news_clusters_output_dir, data_version)
         
         ### output files name
         self.filtered_newsinfo = 'filtered_newsinfo.pkl'
+        self.news_clusters = 'news_clusters.csv'
+        
+        ### Format of the second filter files: 'parquet' keeps the label columns (Windcodes, Source, ...) as lists,
+        ### 'csv' writes them as reprs
+        self.stage_format = 'parquet'
+        
+        ### Write each publishdate's news into split_publishdate_output_dir before the second filter. No stage reads
+        ### these files, the split frames go to the second filter in memory
+        self.save_split_publishdate = False
+        
+        ### Drop repeated news (same CJK characters in content) over the whole month and keep the earliest one,
+        ### False drops them within each publishdate only
+        self.month_dedup = True
+        
+        ### Near-duplicate news (lightly edited reposts), searched over the whole month when month_dedup is True:
+        ### MinHash of the shingle_size character shingles of the CJK only content, LSH with lsh_bands bands of the signature,
+        ### candidates with the same Windcodes whose signatures agree on at least near_dedup_threshold of the values with the
+        ### earliest news of the cluster are clustered and only that earliest news is kept
+        self.near_dedup = True
+        self.shingle_size = 5
+        self.minhash_num_perm = 64
+        self.lsh_bands = 16
+        self.near_dedup_threshold = 0.8
+        
+        ### News whose content (same CJK characters) was processed by an earlier data version, looked up in the store under
+        ### seen_content_dir when month_dedup is True: 'drop' them, 'flag' them in a Seen_Before column (1/0), or None
+        ### to neither look up nor update the store
+        self.seen_content_action = 'drop'
         
 if __name__ == '__main__':
     config = Origin_news_config()
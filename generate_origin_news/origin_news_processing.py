@@ -2,7 +2,10 @@ import pandas as pd
 import numpy as np
 import os
 import re
+import hashlib
 import warnings
+from joblib import Parallel, delayed
+from pipeline_utils import seen_content, stage_io
 
 warnings.filterwarnings("ignore")
 
@@ -21,60 +24,152 @@ def split_labels(string):
             output_string = [string]
     return output_string
 
+def split_labels_array(labels):
+    """
+    :param labels: Series of labels in string or Nonetype
+    :return: object array of label lists, same result as split_labels on each value
+        Each distinct label string is split only once, so rows with the same labels share one list (read only)
+    """
+    codes, uniques = pd.factorize(labels)
+    # Code -1 (missing value) takes the last element, the empty list
+    split_uniques = np.empty(len(uniques) + 1, dtype=object)
+    for i, label in enumerate(uniques):
+        split_uniques[i] = split_labels(label)
+    split_uniques[-1] = []
+    return split_uniques[codes]
+
+def split_datetime_array(publishdate):
+    """
+    :param publishdate: Series of publishdate in datetime or 'YYYY-MM-DD HH:MM:SS' string
+    :return: object arrays of 'YYYYMMDD' dates and 'HH:MM:SS' times, same as str(x)[:10].replace('-','') and str(x)[11:19]
+    """
+    if pd.api.types.is_datetime64_dtype(publishdate):
+        # Format each distinct day and each distinct second of the day once
+        values = publishdate.to_numpy()
+        days = values.astype('datetime64[D]')
+        day_codes, day_uniques = pd.factorize(days)
+        publish_date = pd.DatetimeIndex(day_uniques).strftime('%Y%m%d').to_numpy(dtype=object)[day_codes]
+        seconds = (values - days.astype(values.dtype)).astype('timedelta64[s]').astype(np.int64)
+        second_codes, second_uniques = pd.factorize(seconds)
+        publish_time = np.array([f'{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}' for s in second_uniques],
+                                dtype=object)[second_codes]
+    else:
+        codes, uniques = pd.factorize(publishdate.astype(str))
+        publish_date = np.array([x[:10].replace('-', '') for x in uniques], dtype=object)[codes]
+        publish_time = np.array([x[11:19] for x in uniques], dtype=object)[codes]
+    return publish_date, publish_time
+
 def financialnews_preprocess(financialnews):
     """
     :param financialnews: Raw Financialnews DataFrame
     :return: filtered financialnews table
     """
     # Filter no empty publishdate, title, content
-    financialnews = financialnews[(financialnews.publishdate.notnull()) & (financialnews.title.notnull()) & (financialnews.content.notnull())].reset_index(drop=True) # Another way: financialnews = financialnews.dropna(subset=['publishdate', 'title', 'content']).reset_index(drop=True)
+    financialnews = financialnews[(financialnews.publishdate.notnull()) & (financialnews.title.notnull()) & (financialnews.content.notnull())].reset_index(drop=True)
     
     # Split publishdate from YYYY-MM-DD HH:MM:SS to YYYYMMDD and HH:MM:SS
-    financialnews['publish_date'] = financialnews.publishdate.apply(lambda x: str(x)[:10].replace('-',''))
-    financialnews['publish_time'] = financialnews.publishdate.apply(lambda x: str(x)[11:19])
+    publish_date, publish_time = split_datetime_array(financialnews.publishdate)
     
     # Split '|' in labels into list. If it's empty, fill it with []
     split_label_list = ['windcodes', 'source', 'sections', 'areacodes', 'industrycodes', 'mktsentiments', 'newslevels']
-    for label in split_label_list:
-        financialnews[label] = financialnews[label].apply(lambda x: split_labels(x))
     
-    # Construct News_ID label (maybe not use later, just unite)
-    financialnews = financialnews.reset_index()
-    financialnews['index'] = financialnews['index'] + 1
-    financialnews['News_ID'] = financialnews.apply(lambda x: x['publish_date'][:6]+str(x['index']).zfill(6)+x['publish_date']+x['publish_time'][:2], axis=1)
+    # Construct News_ID label (maybe not use later, just unite): YYYYMM + 6 digits row number from 1 + YYYYMMDD + HH
+    month_prefix = np.array([x[:6] for x in publish_date], dtype=object)
+    hour_suffix = np.array([x[:2] for x in publish_time], dtype=object)
+    row_number = np.array([str(i).zfill(6) for i in range(1, len(financialnews) + 1)], dtype=object)
+    news_id = month_prefix + row_number + publish_date + hour_suffix
     
     # Filter out final use columns and rename columns
-    financialnews = financialnews[['News_ID','publish_date','publish_time','title','content'] + split_label_list]
-    financialnews.columns = ['News_ID','publishDate','publishTime','Title','Content','Windcodes','Source','Sections','Areacodes','Industrycodes','Mktsentiments','Newslevels']
+    output = pd.DataFrame({'News_ID': news_id, 'publishDate': publish_date, 'publishTime': publish_time,
+                           'Title': financialnews.title.to_numpy(), 'Content': financialnews.content.to_numpy()})
+    for label, column in zip(split_label_list, ['Windcodes','Source','Sections','Areacodes','Industrycodes','Mktsentiments','Newslevels']):
+        output[column] = split_labels_array(financialnews[label])
     
-    return financialnews
+    return output
 
-def split_publishdate(financialnews, publishdate, config):
+def split_publishdate(financialnews):
     """
     :param financialnews: DataFrame waiting to split
-    :param publishdate: News publishdate to split DataFrame
+    :return: list of each publishdate's DataFrame, in order of first appearance of the publishdate
+    """
+    # One groupby pass over the month instead of scanning the whole month once per publishdate
+    return [eachdate_financialnews.reset_index(drop=True)
+            for _, eachdate_financialnews in financialnews.groupby('publishDate', sort=False)]
+
+def save_split_publishdate(eachdate_financialnews, config):
+    """
+    :param eachdate_financialnews: one publishdate's DataFrame
     :param config: setting path to save files
     :return: each publishdate's DataFrame
     """
-    eachdate_financialnews = financialnews[financialnews.publishDate == publishdate].reset_index(drop=True)
+    publishdate = eachdate_financialnews.publishDate[0]
     save_file_name = str(publishdate) + '.csv'
     eachdate_financialnews.to_csv(os.path.join(config.split_publishdate_output_dir, save_file_name), index=False, encoding='utf_8_sig')
     
     return eachdate_financialnews
 
+# Patterns compiled once for the whole month
+HTML_TAG_PATTERN = re.compile(r'<[^<]*?>', re.S)
+WHITESPACE_PATTERN = re.compile(r'\s')
+# Everything but CJK characters, what is left is the key used to find repeated news
+NON_CJK_PATTERN = re.compile(r'[^\u4e00-\u9fa5]+')
+
 def HtmlFormat_Clear(content):
     """
     :param content: content waiting to delete HTML signs
     :return: content without HTML signs
     """
-    dr = re.compile(r'<[^<]*?>', re.S)
-    content = dr.sub('', content)
-    content = re.sub('\n', '', content)
-    content = re.sub('\s', '', content)
-    content = re.sub('&nbsp;', '', content)
+    content = HTML_TAG_PATTERN.sub('', content)
+    content = WHITESPACE_PATTERN.sub('', content)
+    content = content.replace('&nbsp;', '')
     
     return content
 
+def clean_html(content):
+    """
+    :param content: content waiting to delete HTML signs
+    :return: content without HTML signs, same as HtmlFormat_Clear(HtmlFormat_Clear(content))
+    """
+    if '<' in content:
+        content = HTML_TAG_PATTERN.sub('', content)
+    content = WHITESPACE_PATTERN.sub('', content)
+    if '&' in content:
+        content = content.replace('&nbsp;', '')
+    # The second HtmlFormat_Clear only finds tags or '&nbsp;' joined by the removals above, e.g. '<<b>p>',
+    # all whitespaces are gone already
+    if '<' in content:
+        content = HTML_TAG_PATTERN.sub('', content)
+    if '&' in content:
+        content = content.replace('&nbsp;', '')
+    return content
+
+def clean_news_frame(dataframe):
+    """
+    :param dataframe: news DataFrame with Title and Content in string format
+    :return: DataFrame with FormatTitle and FormatContent cleaned of HTML signs and TempContent, the CJK only key of FormatContent
+    """
+    format_content = [clean_html(content) for content in dataframe.Content]
+    dataframe = dataframe.rename(columns={'Title':'FormatTitle', 'Content':'FormatContent'})
+    dataframe['FormatTitle'] = [clean_html(title) for title in dataframe.FormatTitle]
+    dataframe['FormatContent'] = format_content
+    dataframe['TempContent'] = [NON_CJK_PATTERN.sub('', content) for content in format_content]
+    return dataframe
+
+def clean_news_parallel(dataframe, n_jobs=20, min_rows=10000):
+    """
+    :param dataframe: news DataFrame with Title and Content in string format
+    :param n_jobs: number of processes
+    :param min_rows: frames smaller than this are cleaned in this process
+    :return: clean_news_frame of the whole DataFrame, cleaned in n_jobs processes chunk by chunk
+    """
+    n_jobs = min(n_jobs, os.cpu_count() or 1)
+    if n_jobs <= 1 or len(dataframe) < min_rows:
+        return clean_news_frame(dataframe)
+    chunk_bounds = np.linspace(0, len(dataframe), n_jobs + 1).astype(int)
+    chunk_list = Parallel(n_jobs=n_jobs)(delayed(clean_news_frame)(dataframe.iloc[start:end])
+                                         for start, end in zip(chunk_bounds[:-1], chunk_bounds[1:]))
+    return pd.concat(chunk_list)
+
 def second_filter(dataframe, config):
     """
     :param dataframe: DataFrame waiting to drop duplicates 
@@ -83,32 +178,285 @@ def second_filter(dataframe, config):
     :return: DataFrame without repeated news
     """
     # Drop rows whose Title or Content are not in string format
-    dataframe['judge_drop'] = dataframe.apply(lambda x: 1 if ((type(x['Title']) == str) and (type(x['Content']) == str)) else 0, axis=1)
-    dataframe = dataframe[dataframe.judge_drop == 1].reset_index(drop=True)
-    
-    # Remove HTML signs in Title and Content
-    dataframe.Title = dataframe.Title.apply(lambda x: HtmlFormat_Clear(HtmlFormat_Clear(x)))
-    dataframe.Content = dataframe.Content.apply(lambda x: HtmlFormat_Clear(HtmlFormat_Clear(x)))
-    dataframe.rename(columns={'Title':'FormatTitle', 'Content':'FormatContent'}, inplace=True)
+    is_str = [(type(title) == str) and (type(content) == str) for title, content in zip(dataframe.Title, dataframe.Content)]
+    dataframe = dataframe[is_str].reset_index(drop=True)
     
-    # Build up a TempContent without any punctuations
-    dataframe['TempContent'] = dataframe.FormatContent.apply(lambda x: ''.join(re.findall(r'[\u4e00-\u9fa5]', x)))
+    # Remove HTML signs in Title and Content, and build up a TempContent without any punctuations
+    dataframe = clean_news_frame(dataframe)
     
     # Keep the first news when some of them are same in TempContent
     dataframe = dataframe.sort_values(by=['TempContent','publishTime'], ascending=(True, True)).reset_index(drop=True)
     dataframe = dataframe.drop_duplicates(subset=['TempContent'], keep='first').reset_index(drop=True)
     
     # Drop news with empty Title or Contents less than 10 words
-    dataframe['judge_drop'] = dataframe.apply(lambda x: 1 if ((len(x['FormatTitle']) > 0) and (len(x['TempContent']) > 10)) else 0, axis=1)
-    dataframe = dataframe[dataframe.judge_drop == 1].reset_index(drop=True)
+    dataframe = dataframe[(dataframe.FormatTitle.str.len() > 0) & (dataframe.TempContent.str.len() > 10)].reset_index(drop=True)
     
     # Drop not useful columns
-    dataframe = dataframe.drop(['TempContent','judge_drop'], axis=1)
+    dataframe = dataframe.drop(['TempContent'], axis=1)
     
     # Save processed data
+    save_second_filter(dataframe, config)
+    
+    return dataframe
+
+def save_second_filter(dataframe, config):
+    """
+    :param dataframe: one publishdate's DataFrame after the second filter
+    :param config: setting path to save files
+    :return: the same DataFrame
+    """
     publishdate = dataframe.publishDate[0]
-    save_file_name = str(publishdate) + '_secondfilter.csv'
-    dataframe.to_csv(os.path.join(config.second_filter_output_dir, save_file_name), index=False, encoding='utf_8_sig')
+    stage_io.write_stage_frame(dataframe, config.second_filter_output_dir, str(publishdate) + '_secondfilter', config.stage_format)
     
     return dataframe
+
+def get_content_digest(contents):
+    """
+    :param contents: Series of TempContent
+    :return: (n, 2) uint64 array, the 128 bits blake2b digest of each content
+    """
+    digests = b''.join(hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest() for content in contents)
+    return np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+
+def drop_duplicated_news(dataframe):
+    """
+    :param dataframe: news DataFrame with TempContent, publishDate and publishTime
+    :return: DataFrame keeping, for each TempContent, the news published first (the first row among news published at the same time)
+    """
+    digest = get_content_digest(dataframe.TempContent)
+    # YYYYMMDDHHMMSS as integer, the earliest news of each digest is found by one hash groupby, without sorting the month
+    publish_key = pd.Series(pd.to_numeric(dataframe.publishDate + dataframe.publishTime.str.replace(':', '', regex=False)).to_numpy())
+    keep_index = publish_key.groupby([digest[:, 0], digest[:, 1]], sort=False).idxmin().to_numpy()
+    is_kept = np.zeros(len(dataframe), dtype=bool)
+    is_kept[keep_index] = True
+    return dataframe[is_kept].reset_index(drop=True)
+
+# Constants of the shingle hashes: polynomial base of the rolling hash and multipliers of the final mixing (splitmix64)
+SHINGLE_BASE = np.uint64(0x100000001b3)
+MIX_MULTIPLIER_1 = np.uint64(0xbf58476d1ce4e5b9)
+MIX_MULTIPLIER_2 = np.uint64(0x94d049bb133111eb)
+
+def get_shingle_hashes(contents, shingle_size):
+    """
+    :param contents: list of strings, each at least shingle_size characters long
+    :param shingle_size: number of characters in each shingle
+    :return: uint64 array of the hashes of all shingles (every shingle_size consecutive characters) of all contents,
+        and the position of each content's first shingle in that array
+    """
+    lengths = np.fromiter((len(content) for content in contents), dtype=np.int64, count=len(contents))
+    # The code points of all contents in one array, shingles running over two contents are dropped below
+    chars = np.frombuffer(''.join(contents).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    num_windows = len(chars) - shingle_size + 1
+    hashes = np.zeros(num_windows, dtype=np.uint64)
+    for i in range(shingle_size):
+        hashes *= SHINGLE_BASE
+        hashes += chars[i:i + num_windows]
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= MIX_MULTIPLIER_1
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= MIX_MULTIPLIER_2
+    hashes ^= hashes >> np.uint64(31)
+    
+    content_start = np.cumsum(lengths) - lengths
+    content_shingles = lengths - shingle_size + 1
+    window_content = np.repeat(np.arange(len(contents)), lengths)[:num_windows]
+    is_inside = (np.arange(num_windows) - content_start[window_content]) < content_shingles[window_content]
+    return hashes[is_inside], np.cumsum(content_shingles) - content_shingles
+
+def get_minhash_signatures(contents, shingle_size=5, num_perm=64, chunk_chars=2 ** 22, seed=0):
+    """
+    :param contents: Series of strings, each at least shingle_size characters long
+    :param shingle_size: number of characters in each shingle
+    :param num_perm: number of hash functions, length of each signature
+    :param chunk_chars: contents are hashed by chunks of about this many characters to bound the memory in use
+    :param seed: random seed of the hash functions, only signatures made with the same seed can be compared
+    :return: (n, num_perm) uint32 array, the MinHash signature of each content's set of shingles
+        --> The share of equal values in two signatures estimates the Jaccard similarity of the two shingle sets
+    """
+    # Multiply-shift hash functions: the high 32 bits of a * x + b, with a odd
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    
+    contents = list(contents)
+    lengths = np.fromiter((len(content) for content in contents), dtype=np.int64, count=len(contents))
+    chunk_bounds = np.searchsorted(np.cumsum(lengths), np.arange(chunk_chars, lengths.sum(), chunk_chars))
+    chunk_bounds = np.unique(np.concatenate([[0], chunk_bounds, [len(contents)]]))
+    
+    signatures = np.empty((len(contents), num_perm), dtype=np.uint32)
+    for start, end in zip(chunk_bounds[:-1], chunk_bounds[1:]):
+        shingles, offsets = get_shingle_hashes(contents[start:end], shingle_size)
+        permuted = np.empty_like(shingles)
+        for i in range(num_perm):
+            np.multiply(shingles, multipliers[i], out=permuted)
+            permuted += increments[i]
+            permuted >>= np.uint64(32)
+            signatures[start:end, i] = np.minimum.reduceat(permuted, offsets)
+    return signatures
+
+def get_star_clusters(signatures, parent, threshold):
+    """
+    :param signatures: (n, num_perm) MinHash signatures
+    :param parent: int array, an earlier similar news of each news (the news itself when it has none)
+    :param threshold: least share of equal signature values between a news and the representative of its cluster
+    :return: int array, the representative of each news: the root of its parent chain, or a news of the chain when the root
+        is not similar enough. Members are never linked to their representative only through other members
+    """
+    parent = parent.copy()
+    nodes = np.arange(len(parent))
+    while True:
+        # Point every news straight at the root of its chain
+        root = parent
+        while True:
+            next_root = root[root]
+            if np.array_equal(next_root, root):
+                break
+            root = next_root
+        member = np.flatnonzero(root != nodes)
+        is_far = np.zeros(len(parent), dtype=bool)
+        is_far[member] = (signatures[member] == signatures[root[member]]).mean(axis=1) < threshold
+        if not is_far.any():
+            return root
+        # The first far news of each chain starts its own cluster, the news chained through it are checked against it next
+        is_breaking = is_far & ~is_far[parent]
+        parent[is_breaking] = nodes[is_breaking]
+
+def cluster_near_duplicated_news(signatures, num_bands=16, threshold=0.8, group_keys=None):
+    """
+    :param signatures: (n, num_perm) MinHash signatures in order of publish time (earliest first), num_perm is a multiple of num_bands
+    :param num_bands: number of LSH bands, news sharing one band of their signature are candidates
+    :param threshold: least share of equal signature values (estimated Jaccard similarity) between a news and its cluster's representative
+    :param group_keys: int array, only news with the same key can share a cluster (e.g. the same Windcodes), None for no restriction
+    :return: int array, the cluster of each news (row number of its representative, the earliest news of the cluster)
+        --> Each news is only compared with the first news of its buckets, one pass per band, so the time is linear in n
+    """
+    num_news, num_perm = signatures.shape
+    rows_per_band = num_perm // num_bands
+    if group_keys is None:
+        group_keys = np.zeros(num_news, dtype=np.int64)
+    group_keys = np.asarray(group_keys)
+    parent = np.arange(num_news)
+    for band in range(num_bands):
+        # One uint64 key per band and group, two bands colliding on the key are told apart by the checks below
+        band_key = group_keys.astype(np.uint64)
+        for i in range(band * rows_per_band, (band + 1) * rows_per_band):
+            band_key *= SHINGLE_BASE
+            band_key += signatures[:, i]
+        bucket_codes, bucket_uniques = pd.factorize(band_key)
+        # factorize numbers the buckets in order of appearance, writing the rows backwards leaves each bucket's first row
+        bucket_first = np.empty(len(bucket_uniques), dtype=np.int64)
+        bucket_first[bucket_codes[::-1]] = np.arange(num_news)[::-1]
+        first = bucket_first[bucket_codes]
+        is_candidate = first != np.arange(num_news)
+        candidate, first = np.flatnonzero(is_candidate), first[is_candidate]
+        is_similar = ((signatures[candidate] == signatures[first]).mean(axis=1) >= threshold) & (group_keys[candidate] == group_keys[first])
+        # Each news points at the earliest similar news found in any band
+        np.minimum.at(parent, candidate[is_similar], first[is_similar])
+    return get_star_clusters(signatures, parent, threshold)
+
+def get_windcodes_keys(windcodes):
+    """
+    :param windcodes: Windcodes lists of the news
+    :return: int array, the same key for news with the same set of Windcodes
+    """
+    return pd.factorize(pd.Series(['|'.join(sorted(set(codes))) for codes in windcodes], dtype=object))[0]
+
+def drop_near_duplicated_news(dataframe, config):
+    """
+    :param dataframe: news DataFrame with News_ID, TempContent, Windcodes, publishDate and publishTime, without repeated TempContent
+    :param config: setting of the near-duplicate search (shingle_size, minhash_num_perm, lsh_bands, near_dedup_threshold)
+    :return: DataFrame keeping the news published first of each cluster of near-duplicate news,
+        and DataFrame of the clusters with more than one news: News_ID, Cluster_ID (News_ID of the news kept), publishDate, publishTime, Similarity
+        --> Only news with the same Windcodes are clustered, templated notices of different issuers all keep their codes
+    """
+    publish_key = pd.to_numeric(dataframe.publishDate + dataframe.publishTime.str.replace(':', '', regex=False)).to_numpy()
+    # Contents shorter than one shingle are never near-duplicates. The others are hashed in order of publish time, the
+    # representative of each cluster is its earliest news (the first row among news published at the same time)
+    long_index = np.flatnonzero((dataframe.TempContent.str.len() >= config.shingle_size).to_numpy())
+    long_index = long_index[np.argsort(publish_key[long_index], kind='stable')]
+    signatures = get_minhash_signatures(dataframe.TempContent.to_numpy()[long_index], config.shingle_size, config.minhash_num_perm)
+    windcodes_keys = get_windcodes_keys(dataframe.Windcodes.to_numpy()[long_index])
+    representative = np.arange(len(dataframe))
+    representative[long_index] = long_index[cluster_near_duplicated_news(signatures, config.lsh_bands, config.near_dedup_threshold, windcodes_keys)]
+    
+    is_clustered = pd.Series(representative).duplicated(keep=False).to_numpy()
+    signature_row = np.full(len(dataframe), -1)
+    signature_row[long_index] = np.arange(len(long_index))
+    member, member_representative = np.flatnonzero(is_clustered), representative[is_clustered]
+    news_clusters = pd.DataFrame({'News_ID': dataframe.News_ID.to_numpy()[member],
+                                  'Cluster_ID': dataframe.News_ID.to_numpy()[member_representative],
+                                  'publishDate': dataframe.publishDate.to_numpy()[member],
+                                  'publishTime': dataframe.publishTime.to_numpy()[member],
+                                  'Similarity': (signatures[signature_row[member]] == signatures[signature_row[member_representative]]).mean(axis=1)})
+    
+    return dataframe[representative == np.arange(len(dataframe))].reset_index(drop=True), news_clusters
+
+def drop_seen_news(dataframe, config):
+    """
+    :param dataframe: news DataFrame with TempContent, without repeated TempContent
+    :param config: setting of the seen content store (seen_content_dir, data_version, seen_content_action)
+    :return: DataFrame without the news whose content was processed by an earlier data version ('drop'),
+        or with them marked 1 in a Seen_Before column ('flag')
+    """
+    if config.seen_content_action not in ('drop', 'flag'):
+        raise ValueError(f'Unknown seen_content_action: {config.seen_content_action}')
+    # 64 bits of the content digest, collisions are not expected before billions of contents
+    fingerprints = get_content_digest(dataframe.TempContent)[:, 0]
+    is_seen = seen_content.is_seen_content(fingerprints, config.seen_content_dir, config.data_version)
+    seen_content.update_seen_content(fingerprints, config.seen_content_dir, config.data_version)
+    
+    if config.seen_content_action == 'drop':
+        return dataframe[~is_seen].reset_index(drop=True)
+    dataframe['Seen_Before'] = is_seen.astype(int)
+    return dataframe
+
+def save_news_clusters(news_clusters, config):
+    """
+    :param news_clusters: DataFrame of the clusters of near-duplicate news
+    :param config: setting path to save files
+    :return: the same DataFrame
+    """
+    if not os.path.exists(config.news_clusters_output_dir):
+        os.makedirs(config.news_clusters_output_dir)
+    news_clusters.to_csv(os.path.join(config.news_clusters_output_dir, config.news_clusters), index=False, encoding='utf_8_sig')
+    
+    return news_clusters
+
+def second_filter_month(financialnews, config, n_jobs=20):
+    """
+    :param financialnews: the whole month of news after financialnews_preprocess
+    :param config: setting of the near-duplicate search and path to save the clusters
+    :param n_jobs: number of processes cleaning HTML signs
+    :return: list of each publishdate's DataFrame without repeated news, repeated news are searched over the whole month
+        --> For news repeated on several days, we just keep the one whose publishdate and publishtime is at first. Drop others.
+        --> With config.near_dedup, the same is done for each cluster of near-duplicate news (lightly edited reposts)
+        --> News processed by an earlier data version are dropped or flagged as set by config.seen_content_action
+    """
+    # Drop rows whose Title or Content are not in string format
+    is_str = [(type(title) == str) and (type(content) == str) for title, content in zip(financialnews.Title, financialnews.Content)]
+    dataframe = financialnews[is_str].reset_index(drop=True)
+    
+    # Remove HTML signs in Title and Content, and build up a TempContent without any punctuations
+    dataframe = clean_news_parallel(dataframe, n_jobs=n_jobs)
+    dataframe = dataframe.reset_index(drop=True)
+    
+    # Keep the first news when some of them are same in TempContent, over the whole month
+    dataframe = drop_duplicated_news(dataframe)
+    
+    # Drop news with empty Title or Contents less than 10 words
+    dataframe = dataframe[(dataframe.FormatTitle.str.len() > 0) & (dataframe.TempContent.str.len() > 10)].reset_index(drop=True)
+    
+    # Drop or flag news already processed by an earlier data version, then store this month's contents as processed
+    if config.seen_content_action is not None:
+        dataframe = drop_seen_news(dataframe, config)
+    
+    # Keep the first news of each cluster of near-duplicate news and save which news each cluster holds
+    if config.near_dedup:
+        dataframe, news_clusters = drop_near_duplicated_news(dataframe, config)
+        save_news_clusters(news_clusters, config)
+    
+    # Drop not useful columns
+    dataframe = dataframe.drop(['TempContent'], axis=1)
+    
+    return split_publishdate(dataframe)
     
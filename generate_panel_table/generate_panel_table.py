@@ -1,7 +1,9 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/generate_panel_table')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
 import pandas as pd
 import os
+from pipeline_utils import stage_io
 from panel_table_config import Panel_table_config
 import panel_table_processing
 import warnings
@@ -9,21 +11,28 @@ import warnings
 warnings.filterwarnings("ignore")
 
 
-def generate_panel_table(data_date=None):
+def generate_panel_table(data_date=None, bond_profile_date=None):
+    '''
+    :param data_date: Data version
+    :param bond_profile_date: Data version of the bond_profile giving the default dates, None for data_date. A later version
+        is used when an earlier month is updated by the incremental relabel
+    '''
     panel_table_config = Panel_table_config(data_date=data_date)
     
     # ----- Load Data in Use ----- #
     ####################################################################################################################
     jieba_score_input_path = panel_table_config.jieba_score_input_dir
     bond_profile_input_path = panel_table_config.bond_profile_input_dir
+    if bond_profile_date is not None:
+        bond_profile_input_path = os.path.join(os.path.dirname(bond_profile_input_path), bond_profile_date)
     panel_table_output_path = panel_table_config.panel_table_output_dir
     
     # Load in bond_profile.pkl
     bond_profile = pd.read_pickle(os.path.join(bond_profile_input_path, 'bond_profile.pkl'))[['b_info_issuercode','b_info_issuer','b_default_date']].drop_duplicates().reset_index(drop=True)
     
     # Load in jieba score file
-    filename = list(os.listdir(jieba_score_input_path))[0]
-    df_jiebascore = pd.read_csv(os.path.join(jieba_score_input_path, filename))[['b_info_issuercode','jieba_score_div_lenissuer_wordnum']]
+    filename = os.path.basename(stage_io.list_stage_files(jieba_score_input_path)[0])
+    df_jiebascore = stage_io.read_stage_frame(os.path.join(jieba_score_input_path, filename), columns=['b_info_issuercode','jieba_score_div_lenissuer_wordnum'])
     
     # ----- Data Cleaning Processing ----- #
     ####################################################################################################################
@@ -12,9 +12,7 @@ def jieba_score_processing(dataframe):
     :param dataframe: DataFrame waiting to change into panel table
     :return: DataFrame prepared for panel table merge
     """
-    # First check b_info_issuercode's format is list
-    dataframe['b_info_issuercode'] = dataframe['b_info_issuercode'].apply(lambda x: eval(x) if type(x) == str else x)
-    
+    # b_info_issuercode is loaded as lists by stage_io
     # Explode b_info_issuercode and calculate each issuercode's jieba score sum value
     dataframe = dataframe.explode('b_info_issuercode').reset_index(drop=True)
     dataframe = dataframe.groupby('b_info_issuercode').sum().reset_index()
@@ -39,7 +37,8 @@ def bond_profile_processing(bond_profile):
     bond_default = bond_profile.dropna(subset=['b_default_date']).reset_index(drop=True)
     bond_default['b_default_date'] = bond_default['b_default_date'].apply(lambda x: str(int(x)))
     default_issuercode = list(bond_default['b_info_issuercode'].unique())
-    bond_default_aggregate = bond_default.groupby(['b_info_issuercode','b_info_issuer']).agg({'b_default_date':lambda x: x.tolist()}).reset_index()
+    # observed=True: bond_profile codes are categoricals, only existing (issuercode, issuer) pairs are grouped
+    bond_default_aggregate = bond_default.groupby(['b_info_issuercode','b_info_issuer'], observed=True).agg({'b_default_date':lambda x: x.tolist()}).reset_index()
     
     return bond_default, default_issuercode, bond_default_aggregate
 
@@ -0,0 +1,138 @@
+import sys
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/get_data_from_mysql')
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
+from local_wds import create_local_wds, serve_local_wds, DEFAULT_ROW_COUNT_DICT
+from mysql_config import MySQL_config
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import argparse
+import resource
+import warnings
+import tempfile
+import shutil
+import time
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Extraction modes: MySQL_config attributes overridden in each mode
+EXTRACTION_MODE_DICT = {
+    'buffered': {'stream_extract': False, 'parallel_extract': False, 'partition_extract': False},
+    'stream': {'stream_extract': True, 'parallel_extract': False, 'partition_extract': False},
+    'parallel': {'stream_extract': True, 'parallel_extract': True, 'partition_extract': False},
+    'partition': {'stream_extract': True, 'parallel_extract': True, 'partition_extract': True},
+    'partition_no_projection': {'stream_extract': True, 'parallel_extract': True, 'partition_extract': True,
+                                'column_projection': False},
+    'partition_pushdown': {'stream_extract': True, 'parallel_extract': True, 'partition_extract': True,
+                           'financialnews_pushdown': 'windcodes'},
+}
+
+
+def get_snapshot_stats(snapshot_dir):
+    """
+    :param snapshot_dir: Snapshot directory written by one extraction
+    :return: (number of rows, bytes on disk) of all tables in the snapshot
+    """
+    num_rows, num_bytes = 0, 0
+    for root, _, file_names in os.walk(snapshot_dir):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            num_bytes += os.path.getsize(file_path)
+            if file_name.endswith('.parquet'):
+                num_rows += pq.read_metadata(file_path).num_rows
+            elif file_name.endswith('.pkl.gz'):
+                num_rows += len(pd.read_pickle(file_path))
+    return num_rows, num_bytes
+
+
+def get_peak_rss_mb():
+    """
+    :return: Peak resident memory of this process in MiB
+    """
+    # VmHWM starts over at exec, ru_maxrss keeps the peak of the parent process it was forked from
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 2 ** 10, 1)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1)
+
+
+def run_extraction_mode(db_path, mode, data_date, partition_rows):
+    """
+    :param db_path: Path of the local wds stand-in
+    :param mode: Key of EXTRACTION_MODE_DICT
+    :param data_date: Date of the extraction, FINANCIALNEWS is selected for the month before
+    :param partition_rows: Rows per partition of the partitioned modes
+    :return: Dict of measurements, run in a fresh process so that the peak RSS belongs to this mode only
+    """
+    from get_data_from_mysql import get_updated_data_from_db
+    # pd.read_sql warns about the sqlite stand-in not being a mysql connection
+    warnings.filterwarnings('ignore', message='pandas only supports SQLAlchemy')
+
+    save_home_dir = tempfile.mkdtemp(prefix=f'wds_{mode}_')
+    mysql_config = MySQL_config(data_date=data_date)
+    mysql_config.save_home_dir = save_home_dir
+    mysql_config.incremental_extract = False
+    mysql_config.dedup_snapshot = False
+    mysql_config.partition_rows = partition_rows
+    for attr, value in EXTRACTION_MODE_DICT[mode].items():
+        setattr(mysql_config, attr, value)
+
+    base_rss_mb = get_peak_rss_mb()
+    try:
+        with serve_local_wds(db_path):
+            start_time = time.time()
+            get_updated_data_from_db(data_date=data_date, mysql_config=mysql_config)
+            seconds = time.time() - start_time
+        num_rows, num_bytes = get_snapshot_stats(os.path.join(save_home_dir, data_date))
+    finally:
+        shutil.rmtree(save_home_dir)
+
+    return {'mode': mode, 'seconds': round(seconds, 2), 'rows': num_rows, 'bytes': num_bytes,
+            'rows_per_sec': round(num_rows / seconds), 'mb_per_sec': round(num_bytes / seconds / 2 ** 20, 2),
+            'peak_rss_mb': get_peak_rss_mb(), 'base_rss_mb': base_rss_mb}
+
+
+def run_extraction_benchmark(db_path=None, row_count_dict=None, mode_list=None, data_date='2024-03-01',
+                             partition_rows=50000):
+    """
+    :param db_path: Path of the local wds stand-in, a temporary one is generated from row_count_dict if None
+    :param row_count_dict: Number of rows of each synthetic table
+    :param mode_list: Extraction modes to measure, all of EXTRACTION_MODE_DICT if None
+    :param data_date: Date of the extraction
+    :param partition_rows: Rows per partition of the partitioned modes
+    :return: DataFrame with rows/sec, MB/sec and peak memory of each mode
+    """
+    is_temp_db = db_path is None
+    if is_temp_db:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='local_wds_'), 'wds.sqlite')
+        print(f'[x] Generating local wds in {db_path}')
+        create_local_wds(db_path, row_count_dict)
+
+    result_list = []
+    try:
+        for mode in mode_list or list(EXTRACTION_MODE_DICT):
+            # One fresh process per mode, the peak memory never goes down within a process
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result_list.append(executor.submit(run_extraction_mode, db_path, mode, data_date, partition_rows).result())
+            print(result_list[-1])
+    finally:
+        if is_temp_db:
+            shutil.rmtree(os.path.dirname(db_path))
+
+    return pd.DataFrame(result_list).set_index('mode')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extraction throughput on a local synthetic WDS')
+    parser.add_argument('--db_path', default=None, help='reuse a stand-in made by local_wds.create_local_wds')
+    parser.add_argument('--news_rows', type=int, default=DEFAULT_ROW_COUNT_DICT['FINANCIALNEWS'])
+    parser.add_argument('--bond_rows', type=int, default=DEFAULT_ROW_COUNT_DICT['CBONDDESCRIPTIONZL'])
+    parser.add_argument('--partition_rows', type=int, default=50000)
+    parser.add_argument('--modes', nargs='*', default=None, choices=list(EXTRACTION_MODE_DICT))
+    args = parser.parse_args()
+
+    row_count_dict = {'FINANCIALNEWS': args.news_rows, 'CBONDDESCRIPTIONZL': args.bond_rows,
+                      'CBONDISSUERZL': args.bond_rows, 'CBONDINDUSTRYWINDZL': args.bond_rows}
+    print(run_extraction_benchmark(args.db_path, row_count_dict, args.modes, partition_rows=args.partition_rows).to_string())
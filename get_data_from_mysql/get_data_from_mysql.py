@@ -1,29 +1,202 @@
 import sys
 sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0/get_data_from_mysql')
-from utils import MySqlConn
+sys.path.insert(0, '/mnt/utnfs/data/sentiment_score_pipeline/python_code/v0.1.0')
+from utils import MySqlConn, MySqlConnPool
 from mysql_config import MySQL_config
+from pipeline_utils import snapshot_io, column_manifest, table_schema
 from datetime import date
 import datetime
-import os, pickle, gzip
+import os, re, json, time
+import pandas as pd
+import numpy as np
+import mysql.connector
 from joblib import Parallel, delayed
 
-def get_wds_table(table_name, mysql_config, date):
+
+def save_wds_table(sel_table, save_dir, table_name, mysql_config):
+    '''
+    :param sel_table: the table selected from the MySQL DB
+    :param save_dir: the directory to save the table
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :return: save the table into save_dir in mysql_config.snapshot_format
+    '''
+    if mysql_config.compact_dtypes:
+        sel_table = table_schema.compact_table(sel_table, table_name)
+    snapshot_io.write_snapshot_table(sel_table, save_dir, table_name,
+                                     snapshot_format=mysql_config.snapshot_format,
+                                     row_group_size=mysql_config.stream_chunk_size)
+
+
+def save_watermark(save_dir, table_name, mysql_config, watermark_col, watermark):
+    '''
+    :param save_dir: the snapshot directory of the table
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param watermark_col: the column used as watermark, e.g. OPDATE
+    :param watermark: the max value of watermark_col inside the snapshot
+    :return: save the watermark next to the table as <table_name>.watermark.json
+    '''
+    with open(os.path.join(save_dir, table_name.lower() + mysql_config.watermark_suffix), 'w') as f:
+        json.dump({'watermark_col': watermark_col, 'watermark': watermark}, f)
+
+
+def load_watermark(snapshot_dir, table_name, mysql_config):
+    '''
+    :param snapshot_dir: the snapshot directory of the table
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :return: dict with 'watermark_col' and 'watermark'
+    '''
+    with open(os.path.join(snapshot_dir, table_name.lower() + mysql_config.watermark_suffix), 'r') as f:
+        return json.load(f)
+
+
+def get_previous_snapshot_dir(table_name, mysql_config, date):
     '''
     :param table_name: the name of the table selected from the MySQL DB
     :param mysql_config: the config used to get the table
     :param date: the date of getting data from DB to the GPU Server
-    :return: save the selected tables into the GPU Server
+    :return: the latest snapshot directory before date which has both the table and its watermark, None if not found
     '''
     save_home_dir = mysql_config.save_home_dir
+    if not os.path.exists(save_home_dir):
+        return None
+    for snapshot_date in sorted(os.listdir(save_home_dir), reverse=True):
+        if snapshot_date >= date:
+            continue
+        snapshot_dir = os.path.join(save_home_dir, snapshot_date)
+        if snapshot_io.get_snapshot_path(snapshot_dir, table_name) is not None and \
+                os.path.exists(os.path.join(snapshot_dir, table_name.lower() + mysql_config.watermark_suffix)):
+            return snapshot_dir
+    return None
+
+
+def get_incremental_table(my_sql_loader, table_name, mysql_config, date):
+    '''
+    :param my_sql_loader: the MySqlConn used to get the table
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: last snapshot merged with the rows changed since its watermark, None if a full pull is needed
+    '''
+    incremental_setting = mysql_config.incremental_table_dict[table_name]
+    key_cols = [col.lower() for col in incremental_setting['key_cols']]
+
+    previous_snapshot_dir = get_previous_snapshot_dir(table_name, mysql_config, date)
+    if previous_snapshot_dir is None:
+        return None
+    watermark = load_watermark(previous_snapshot_dir, table_name, mysql_config)
+    if watermark['watermark_col'] != incremental_setting['watermark_col']:
+        return None
+    previous_table = snapshot_io.read_snapshot_table(previous_snapshot_dir, table_name)
+
+    # Use '>=' so rows changed within the same second as the watermark are not missed, the key dedup below handles them
+    changed_table = my_sql_loader.get_rows_since('wds', table_name, watermark['watermark_col'], watermark['watermark'],
+                                                 cols=get_wds_table_columns(table_name, mysql_config))
+    changed_table.columns = changed_table.columns.str.lower()
+    print(f"[x] {table_name}: {changed_table.shape[0]} rows changed since {watermark['watermark']}")
+
+    # Selected columns changed since last snapshot (e.g. a stage declared a new column), old rows need a full pull
+    if set(changed_table.columns) != set(previous_table.columns):
+        return None
+
+    # Changed rows replace their previous version, new rows are appended
+    sel_table = pd.concat([previous_table, changed_table], ignore_index=True)
+    sel_table = sel_table.drop_duplicates(subset=key_cols, keep='last').reset_index(drop=True)
+
+    return sel_table
 
-    my_sql_loader = MySqlConn(host=mysql_config.host,
-                              user=mysql_config.user,
-                              pw=mysql_config.pw,
-                              port=mysql_config.port,
-                              mode=mysql_config.mode)
 
+def get_financialnews_window(date):
+    '''
+    :param date: the date of getting data from DB to the GPU Server
+    :return: the start date of last month and of this month, FINANCIALNEWS published in between is selected
+    '''
+    today_format = datetime.date(*map(int, date.split('-')))
+    thismonth_startdate = datetime.date(today_format.year, today_format.month, 1)
+    lastmonth_startdate = datetime.date((thismonth_startdate - datetime.timedelta(1)).year, (thismonth_startdate - datetime.timedelta(1)).month, 1).strftime('%Y-%m-%d')
+
+    return lastmonth_startdate, thismonth_startdate.strftime('%Y-%m-%d')
+
+
+def get_wds_table_columns(table_name, mysql_config):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :return: the columns to select: the columns declared by the stages in pipeline_utils.column_manifest, plus the
+        watermark, key and partition columns used by the extractor. None to select all columns
+    '''
+    if not mysql_config.column_projection:
+        return None
+    required_cols = []
+    if table_name in mysql_config.incremental_table_dict:
+        required_cols.append(mysql_config.incremental_table_dict[table_name]['watermark_col'])
+        required_cols += mysql_config.incremental_table_dict[table_name]['key_cols']
+    if table_name in mysql_config.partition_table_dict:
+        required_cols.append(mysql_config.partition_table_dict[table_name])
+
+    return column_manifest.get_extract_columns(table_name, required_cols)
+
+
+def get_bond_profile_codes(mysql_config, date):
+    '''
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: sorted s_info_windcode and b_info_issuercode of the latest bond profile up to date, [] if there is none
+    '''
+    bond_profile_dir = mysql_config.bond_profile_dir
+    if not os.path.exists(bond_profile_dir):
+        return []
+    profile_dates = [profile_date for profile_date in sorted(os.listdir(bond_profile_dir))
+                     if profile_date <= date and os.path.exists(os.path.join(bond_profile_dir, profile_date, 'bond_profile.pkl'))]
+    if len(profile_dates) == 0:
+        return []
+    bond_profile = pd.read_pickle(os.path.join(bond_profile_dir, profile_dates[-1], 'bond_profile.pkl'))
+
+    return sorted(set(bond_profile.s_info_windcode.dropna().astype(str)) | set(bond_profile.b_info_issuercode.dropna().astype(str)))
+
+
+def get_financialnews_pushdown(table_name, mysql_config, date):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: the condition on WINDCODES pushed down into the FINANCIALNEWS query, None if there is no pushdown
+    '''
+    if table_name != 'FINANCIALNEWS' or mysql_config.financialnews_pushdown is None:
+        return None
+
+    # News without any WINDCODES never becomes bond related news
+    condition = "(WINDCODES IS NOT NULL AND WINDCODES <> '')"
+
+    if mysql_config.financialnews_pushdown == 'whitelist':
+        code_list = get_bond_profile_codes(mysql_config, date)
+        # Codes go into the SQL as regex literals, only plain codes such as '123456.IB' are safe to put there
+        if len(code_list) > 0 and all(re.fullmatch(r'[0-9A-Za-z.]+', code) for code in code_list):
+            # A code matching inside a longer code only keeps some extra news, bond_related_processing drops them
+            code_list = [code.replace('.', '[.]') for code in code_list]
+            batch_size = mysql_config.pushdown_regexp_batch_size
+            regexp_list = [f"WINDCODES REGEXP '{'|'.join(code_list[i:i + batch_size])}'"
+                           for i in range(0, len(code_list), batch_size)]
+            condition = f"{condition} AND ({' OR '.join(regexp_list)})"
+        else:
+            print('[!] No usable bond profile for the FINANCIALNEWS whitelist, only empty WINDCODES are filtered')
+
+    return condition
+
+
+def get_wds_table_sql(table_name, date, cols=None, news_condition=None):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param date: the date of getting data from DB to the GPU Server
+    :param cols: the columns to select for tables selected with all columns, None for all columns
+    :param news_condition: the extra condition pushed down into the FINANCIALNEWS query, None for no extra condition
+    :return: the SQL used to select the table
+    '''
+    str_cols = ', '.join(cols) if cols else '*'
     if table_name == 'CBONDPRICESNET':
-        sel_table = my_sql_loader.sql_to_df("""
+        sql = """
                                             SELECT
                                                 S_INFO_WINDCODE, TRADE_DT, B_DQ_OPEN, B_DQ_HIGH, B_DQ_LOW, B_DQ_ORIGINCLOSE,
                                                 B_DQ_VOLUME, B_DQ_AMOUNT
@@ -31,95 +204,309 @@ def get_wds_table(table_name, mysql_config, date):
                                                 wds.CBONDPRICESNET
                                             WHERE B_DQ_VOLUME > 0 AND B_DQ_AMOUNT > 0 AND B_DQ_ORIGINCLOSE > 0
                                         """
-                                            )
 
     elif table_name == 'COMPINTRODUCTION':
-        sel_table = my_sql_loader.sql_to_df("""
+        sql = """
                                                 SELECT
                                                     COMP_ID, COMP_NAME, PROVINCE, REGCAPITAL, CITY, FOUNDDATE, ENDDATE
                                                 FROM
                                                     wds.COMPINTRODUCTION
                                                 WHERE PROVINCE IS NOT NULL
                                             """
-                                            )
 
     elif table_name == 'CBONDCF':
-        sel_table = my_sql_loader.sql_to_df("""
+        sql = """
                                         SELECT
                                             S_INFO_WINDCODE, B_INFO_CARRYDATE, B_INFO_ENDDATE, B_INFO_COUPONRATE, 
                                             B_INFO_PAYMENTDATE, B_INFO_PAYMENTINTEREST, B_INFO_PAYMENTPARVALUE, B_INFO_PAYMENTSUM
                                         FROM
                                             wds.CBONDCF
                                     """
-                                            )
 
     elif table_name == 'CBONDACTUALCF':
-        sel_table = my_sql_loader.sql_to_df("""
+        sql = """
                                             SELECT
                                                 B_INFO_WINDCODE, B_INFO_CARRYDATE, B_INFO_ENDDATE, B_INFO_COUPONRATE, 
                                                 B_INFO_PAYMENTDATE, B_INFO_PAYMENTINTEREST, B_INFO_PAYMENTPARVALUE, B_INFO_PAYMENTSUM
                                             FROM
                                                 wds.CBONDACTUALCF
                                         """
-                                            )
     elif table_name == 'CBONDISSUERRATING':
-        sel_table = my_sql_loader.sql_to_df(
-            """
+        sql = """
             SELECT
             S_INFO_COMPCODE, S_INFO_COMPNAME, ANN_DT, B_RATE_STYLE, B_INFO_CREDITRATING,
             B_RATE_RATINGOUTLOOK, B_INFO_CREDITRATINGAGENCY, B_CREDITRATING_CHANGE, B_INFO_ISSUERRATETYPE
             FROM
             wds.CBONDISSUERRATING
             """
-        )
     elif table_name == 'CBONDRATING':
-        sel_table = my_sql_loader.sql_to_df(
-            """
+        sql = """
             SELECT
             S_INFO_WINDCODE, ANN_DT, B_RATE_STYLE, B_INFO_CREDITRATING,
             B_INFO_CREDITRATINGAGENCY, B_CREDITRATING_CHANGE
             FROM
             wds.CBONDRATING
-            """)
-    elif table_name == 'FINANCIALNEWS':
-        today_format = datetime.date(*map(int, date.split('-')))
-        thismonth_startdate = datetime.date(today_format.year, today_format.month, 1)
-        lastmonth_startdate = datetime.date((thismonth_startdate - datetime.timedelta(1)).year, (thismonth_startdate - datetime.timedelta(1)).month, 1).strftime('%Y-%m-%d')
-        sel_table = my_sql_loader.sql_to_df(
             """
+    elif table_name == 'FINANCIALNEWS':
+        lastmonth_startdate, thismonth_startdate = get_financialnews_window(date)
+        sql = """
             SELECT
-            *
+            """ + str_cols + """
             FROM
             wds.FINANCIALNEWS
-            WHERE (PUBLISHDATE >= '""" + lastmonth_startdate + """ 00:00:00') AND (PUBLISHDATE < '""" + thismonth_startdate.strftime('%Y-%m-%d') + """ 00:00:00')
-            """)
+            WHERE (PUBLISHDATE >= '""" + lastmonth_startdate + """ 00:00:00') AND (PUBLISHDATE < '""" + thismonth_startdate + """ 00:00:00')
+            """
+        if news_condition is not None:
+            sql = f"{sql} AND {news_condition}"
     else:
-        sel_table = my_sql_loader.get_whole_table('wds', table_name)
+        sql = f"SELECT {str_cols} FROM wds.{table_name}"
 
-    sel_table.columns = sel_table.columns.str.lower()
-    save_file_name = table_name.lower()
+    return sql
+
+
+def get_wds_table(table_name, mysql_config, date, conn_pool=None):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :param conn_pool: the MySqlConnPool to borrow the connection from, open a new connection if None
+    :return: save the selected tables into the GPU Server
+    '''
+    if mysql_config.partition_extract and table_name in mysql_config.partition_table_dict:
+        # a partitioned table borrows one connection per key range instead of holding one for the whole table
+        get_partitioned_wds_table(table_name, mysql_config, date, conn_pool)
+    elif conn_pool is None:
+        my_sql_loader = MySqlConn(host=mysql_config.host,
+                                  user=mysql_config.user,
+                                  pw=mysql_config.pw,
+                                  port=mysql_config.port,
+                                  mode=mysql_config.mode)
+        extract_wds_table(my_sql_loader, table_name, mysql_config, date)
+    else:
+        with conn_pool.get_conn() as my_sql_loader:
+            extract_wds_table(my_sql_loader, table_name, mysql_config, date)
+
+
+def get_partition_conditions(my_sql_loader, table_name, mysql_config, date):
+    '''
+    :param my_sql_loader: the MySqlConn used to get the row count and the key range
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: list of WHERE conditions splitting the table into key ranges, [None] if the table is too small to split
+    '''
+    partition_col = mysql_config.partition_table_dict[table_name]
+    where = None
+    if table_name == 'FINANCIALNEWS':
+        lastmonth_startdate, thismonth_startdate = get_financialnews_window(date)
+        where = f"({partition_col} >= '{lastmonth_startdate} 00:00:00') AND ({partition_col} < '{thismonth_startdate} 00:00:00')"
+
+    # Number of partitions follows the row count
+    row_count = my_sql_loader.get_row_count('wds', table_name, where)
+    num_partitions = min(mysql_config.partition_max_num, -(-row_count // mysql_config.partition_rows))
+    if num_partitions <= 1:
+        return [None]
+
+    key_range = my_sql_loader.get_date_range('wds', table_name, partition_col, where)
+    key_min, key_max = key_range.iloc[0, 0], key_range.iloc[0, 1]
+    if pd.isnull(key_min):
+        return [None]
+
+    # Split [key_min, key_max] evenly in time, WDS date keys are 'YYYYMMDD' strings (TRADE_DT) or datetimes (PUBLISHDATE)
+    key_format = '%Y%m%d' if isinstance(key_min, str) and len(key_min) == 8 else '%Y-%m-%d %H:%M:%S'
+    key_edges = np.linspace(pd.to_datetime(key_min).value, pd.to_datetime(key_max).value, num_partitions + 1)[1:-1]
+    key_edges = list(dict.fromkeys(pd.to_datetime(key_edges.astype('int64')).strftime(key_format)))
+
+    # First and last ranges are open ended and NULL keys get their own partition, so each row is read exactly once
+    conditions = [f"{partition_col} < '{key_edges[0]}'"]
+    conditions += [f"{partition_col} >= '{lower}' AND {partition_col} < '{upper}'"
+                   for lower, upper in zip(key_edges[:-1], key_edges[1:])]
+    conditions += [f"{partition_col} >= '{key_edges[-1]}'", f"{partition_col} IS NULL"]
+
+    return conditions
+
+
+def read_wds_partition(conn_pool, partition_sql, mysql_config, file_path=None):
+    '''
+    :param conn_pool: the MySqlConnPool to borrow the connection from
+    :param partition_sql: the SQL selecting one key range of the table
+    :param mysql_config: the config used to get the table
+    :param file_path: stream the partition into this parquet file if given
+    :return: the partition DataFrame, or the number of rows streamed into file_path
+    '''
+    with conn_pool.get_conn() as my_sql_loader:
+        if file_path is None:
+            return my_sql_loader.sql_to_df(partition_sql)
+        return my_sql_loader.sql_to_parquet(partition_sql, file_path,
+                                            chunk_size=mysql_config.stream_chunk_size,
+                                            is_lower_col=True)
+
+
+def get_partitioned_wds_table(table_name, mysql_config, date, conn_pool=None):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :param conn_pool: the MySqlConnPool to borrow the connections from, open a pool for this table if None
+    :return: save the table read in key range partitions over several connections at the same time
+    '''
+    save_dir = os.path.join(mysql_config.save_home_dir, date)
+    is_own_pool = conn_pool is None
+    if is_own_pool:
+        conn_pool = MySqlConnPool(host=mysql_config.host,
+                                  user=mysql_config.user,
+                                  pw=mysql_config.pw,
+                                  port=mysql_config.port,
+                                  mode=mysql_config.mode,
+                                  pool_size=mysql_config.max_connections)
+
+    with conn_pool.get_conn() as my_sql_loader:
+        conditions = get_partition_conditions(my_sql_loader, table_name, mysql_config, date)
+        if conditions == [None]:
+            extract_wds_table(my_sql_loader, table_name, mysql_config, date)
+
+    if conditions != [None]:
+        print(f'[x] {table_name} is read in {len(conditions)} partitions')
+        sql = get_wds_table_sql(table_name, date, get_wds_table_columns(table_name, mysql_config),
+                            get_financialnews_pushdown(table_name, mysql_config, date))
+        partition_sql_list = [f"SELECT * FROM ({sql}) AS wds_partition WHERE {condition}" for condition in conditions]
+
+        if mysql_config.stream_extract:
+            # Each partition is streamed into its own file of the <table>.parquet dataset, nothing is reassembled
+            partition_dir = os.path.join(save_dir, table_name.lower() + '.parquet')
+            if os.path.isfile(partition_dir):
+                os.remove(partition_dir)
+            if not os.path.exists(partition_dir):
+                os.makedirs(partition_dir)
+            for file in os.listdir(partition_dir):
+                if file.startswith('part-'):
+                    os.remove(os.path.join(partition_dir, file))
+            Parallel(n_jobs=len(partition_sql_list), backend='threading')(
+                delayed(read_wds_partition)(conn_pool, partition_sql, mysql_config,
+                                            os.path.join(partition_dir, f'part-{i:05d}.parquet'))
+                for i, partition_sql in enumerate(partition_sql_list))
+        else:
+            partition_list = Parallel(n_jobs=len(partition_sql_list), backend='threading')(
+                delayed(read_wds_partition)(conn_pool, partition_sql, mysql_config) for partition_sql in partition_sql_list)
+            sel_table = pd.concat(partition_list, ignore_index=True)
+            del partition_list
+            sel_table.columns = sel_table.columns.str.lower()
+            save_wds_table(sel_table, save_dir, table_name, mysql_config)
+
+    if is_own_pool:
+        conn_pool.close_all()
+
+
+def get_wds_table_with_retry(table_name, mysql_config, date, conn_pool=None):
+    '''
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :param conn_pool: the MySqlConnPool to borrow the connection from, open a new connection if None
+    :return: get_wds_table, retried with exponential backoff when the connection or the query fails
+    '''
+    for attempt in range(mysql_config.extract_retry):
+        try:
+            return get_wds_table(table_name, mysql_config, date, conn_pool)
+        except (mysql.connector.Error, OSError) as e:
+            if attempt == mysql_config.extract_retry - 1:
+                raise
+            wait_seconds = mysql_config.extract_retry_backoff * 2 ** attempt
+            print(f'[!] Get {table_name} failed: {e}, retry in {wait_seconds}s')
+            time.sleep(wait_seconds)
+
+
+def extract_wds_table(my_sql_loader, table_name, mysql_config, date):
+    '''
+    :param my_sql_loader: the MySqlConn used to get the table
+    :param table_name: the name of the table selected from the MySQL DB
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: save the selected tables into the GPU Server
+    '''
+    save_home_dir = mysql_config.save_home_dir
     save_dir = os.path.join(save_home_dir, date)
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    f = gzip.open(os.path.join(save_dir, save_file_name + '.pkl.gz'), 'wb')
-    pickle.dump(sel_table, f)
-    f.close()
+    sql = get_wds_table_sql(table_name, date, get_wds_table_columns(table_name, mysql_config),
+                            get_financialnews_pushdown(table_name, mysql_config, date))
+
+    incremental_table = None
+    if mysql_config.incremental_extract and table_name in mysql_config.incremental_table_dict:
+        incremental_table = get_incremental_table(my_sql_loader, table_name, mysql_config, date)
+
+    if incremental_table is not None:
+        sel_table = incremental_table
+    elif mysql_config.stream_extract and table_name in mysql_config.stream_table_list:
+        # Large tables are streamed chunk by chunk into a parquet file, so they never sit in memory as a whole
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir)
+        my_sql_loader.sql_to_parquet(sql,
+                                     os.path.join(save_dir, table_name.lower() + '.parquet'),
+                                     chunk_size=mysql_config.stream_chunk_size,
+                                     is_lower_col=True)
+        return
+    else:
+        sel_table = my_sql_loader.sql_to_df(sql)
+
+    sel_table.columns = sel_table.columns.str.lower()
+    save_wds_table(sel_table, save_dir, table_name, mysql_config)
+
+    # Record the watermark of this snapshot for next month's incremental extraction
+    if table_name in mysql_config.incremental_table_dict:
+        watermark_col = mysql_config.incremental_table_dict[table_name]['watermark_col']
+        watermark = sel_table[watermark_col.lower()].max()
+        if pd.notnull(watermark):
+            save_watermark(save_dir, table_name, mysql_config, watermark_col, str(watermark))
 
 
-def get_updated_data_from_db(data_date=None):
+def dedup_snapshot(table_list, mysql_config, date):
+    '''
+    :param table_list: the names of the tables extracted into the snapshot
+    :param mysql_config: the config used to get the table
+    :param date: the date of getting data from DB to the GPU Server
+    :return: the fingerprint of each table, tables unchanged since an earlier snapshot now share its files
+    '''
+    snapshot_dir = os.path.join(mysql_config.save_home_dir, date)
+    fingerprint_dict = {}
+    for table_name in table_list:
+        if snapshot_io.get_snapshot_path(snapshot_dir, table_name) is None:
+            continue
+        fingerprint_dict[table_name] = snapshot_io.dedup_snapshot_table(snapshot_dir, table_name, mysql_config.blob_dir)
+        print(f'[x] {table_name} fingerprint: {fingerprint_dict[table_name]}')
+
+    return fingerprint_dict
+
+
+def get_updated_data_from_db(data_date=None, mysql_config=None):
     '''
     Main function to trigger the update data process
+    mysql_config: the config used to get the tables, MySQL_config(data_date) if not given
     '''
     if data_date == None:
         today = date.today().strftime('%Y-%m-%d')
     else:
         today = data_date
     # today = date.today().strftime('%Y-%m-%d')
-    mysql_config = MySQL_config(data_date=data_date)
-    # Parallel(n_jobs=24, verbose=10)(
-    #     delayed(get_wds_table)(table_name, mysql_config, today) for table_name in mysql_config.table_list)
-    for table_name in mysql_config.table_list:
-        get_wds_table(table_name, mysql_config, today)
+    if mysql_config is None:
+        mysql_config = MySQL_config(data_date=data_date)
+    # the same table listed twice would be written by two tasks at the same time
+    table_list = list(dict.fromkeys(mysql_config.table_list))
+    if mysql_config.parallel_extract:
+        # Independent tables are downloaded at the same time, the pool keeps at most max_connections on the server
+        conn_pool = MySqlConnPool(host=mysql_config.host,
+                                  user=mysql_config.user,
+                                  pw=mysql_config.pw,
+                                  port=mysql_config.port,
+                                  mode=mysql_config.mode,
+                                  pool_size=mysql_config.max_connections)
+        Parallel(n_jobs=mysql_config.max_connections, backend='threading', verbose=10)(
+            delayed(get_wds_table_with_retry)(table_name, mysql_config, today, conn_pool) for table_name in table_list)
+        conn_pool.close_all()
+    else:
+        for table_name in table_list:
+            get_wds_table_with_retry(table_name, mysql_config, today)
+
+    if mysql_config.dedup_snapshot:
+        dedup_snapshot(table_list, mysql_config, today)
 
     print('[x] Get data from DB completed')
 
@@ -140,11 +527,7 @@ def get_data_from_old_db(mysql_config, save_dir, db_name='wind', table_name='def
 
     sel_table = my_sql_loader.get_whole_table(db_name, table_name)
     sel_table.columns = sel_table.columns.str.lower()
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    f = gzip.open(os.path.join(save_dir, table_name.lower() + '.pkl.gz'), 'wb')
-    pickle.dump(sel_table, f)
-    f.close()
+    save_wds_table(sel_table, save_dir, table_name, mysql_config)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,284 @@
+import os
+import re
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import mysql.connector
+from mysql.connector import FieldType
+
+# Synthetic WDS tables: column --> mysql field type reported in cursor.description
+LOCAL_WDS_TABLE_DICT = {
+    'CBONDDESCRIPTIONZL': {'OBJECT_ID': FieldType.VAR_STRING, 'S_INFO_WINDCODE': FieldType.VAR_STRING,
+                           'B_INFO_FULLNAME': FieldType.VAR_STRING, 'B_INFO_ISSUER': FieldType.VAR_STRING,
+                           'B_INFO_ISSUERCODE': FieldType.VAR_STRING, 'B_INFO_SPECIALBONDTYPE': FieldType.VAR_STRING,
+                           'B_INFO_MATURITYDATE': FieldType.VAR_STRING, 'B_INFO_COUPONRATE': FieldType.DOUBLE,
+                           'B_INFO_PAR': FieldType.DOUBLE, 'OPDATE': FieldType.DATETIME},
+    'CBONDISSUERZL': {'OBJECT_ID': FieldType.VAR_STRING, 'S_INFO_WINDCODE': FieldType.VAR_STRING,
+                      'S_INFO_COMPCODE': FieldType.VAR_STRING, 'S_INFO_COMPNAME': FieldType.VAR_STRING,
+                      'OPDATE': FieldType.DATETIME},
+    'CBONDINDUSTRYWINDZL': {'OBJECT_ID': FieldType.VAR_STRING, 'S_INFO_WINDCODE': FieldType.VAR_STRING,
+                            'S_INFO_INDUSTRYNAME': FieldType.VAR_STRING, 'S_INFO_INDUSTRYNAME2': FieldType.VAR_STRING,
+                            'S_INFO_INDUSTRYCODE': FieldType.VAR_STRING, 'OPDATE': FieldType.DATETIME},
+    'CBONDDEFAULTREPORTFORM': {'OBJECT_ID': FieldType.VAR_STRING, 'B_INFO_WINDCODE': FieldType.VAR_STRING,
+                               'B_DEFAULT_DATE': FieldType.VAR_STRING, 'B_DEFAULT_AMOUNT': FieldType.DOUBLE,
+                               'B_DEFAULT_REASON': FieldType.VAR_STRING, 'OPDATE': FieldType.DATETIME},
+    'FINANCIALNEWS': {'OBJECT_ID': FieldType.LONGLONG, 'PUBLISHDATE': FieldType.DATETIME,
+                      'TITLE': FieldType.VAR_STRING, 'CONTENT': FieldType.BLOB, 'WINDCODES': FieldType.VAR_STRING,
+                      'SOURCE': FieldType.VAR_STRING, 'SECTIONS': FieldType.VAR_STRING,
+                      'AREACODES': FieldType.VAR_STRING, 'INDUSTRYCODES': FieldType.VAR_STRING,
+                      'MKTSENTIMENTS': FieldType.VAR_STRING, 'NEWSLEVELS': FieldType.VAR_STRING,
+                      'URL': FieldType.VAR_STRING, 'OPDATE': FieldType.DATETIME}}
+
+DEFAULT_ROW_COUNT_DICT = {'CBONDDESCRIPTIONZL': 100000, 'CBONDISSUERZL': 100000, 'CBONDINDUSTRYWINDZL': 100000,
+                          'CBONDDEFAULTREPORTFORM': 1000, 'FINANCIALNEWS': 300000}
+
+INDUSTRY_NAME_LIST = ['中期票据', '公司债', '企业债', '短期融资券', '同业存单', '金融债', '地方政府债', '资产支持证券']
+
+SOURCE_LIST = ['证券时报', '上海证券报', '中国证券报', '第一财经', '财新网']
+
+
+def get_random_datetime(rng, start, end, size):
+    """
+    :param rng: numpy random Generator
+    :param start: First datetime, e.g. '2023-01-01'
+    :param end: Last datetime (excluded)
+    :param size: Number of datetimes
+    :return: Array of 'YYYY-MM-DD HH:MM:SS' strings
+    """
+    seconds = rng.integers(0, int((pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()), size)
+    return (pd.Timestamp(start) + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+
+
+def make_bond_tables(row_count_dict, rng):
+    """
+    :param row_count_dict: Number of rows of each table
+    :param rng: numpy random Generator
+    :return: Dict of table name --> DataFrame of the four bond tables
+    """
+    num_bond = row_count_dict['CBONDDESCRIPTIONZL']
+    num_issuer = max(num_bond // 10, 1)
+    windcode = np.char.add(np.char.zfill(np.arange(num_bond).astype(str), 6), '.IB')
+    issuer_index = rng.integers(0, num_issuer, num_bond)
+    issuercode = np.char.add('C', np.char.zfill(issuer_index.astype(str), 8))
+    issuer = np.char.add('合成发行人', issuer_index.astype(str))
+    industry_name = rng.choice(INDUSTRY_NAME_LIST, num_bond)
+
+    def object_id(prefix, num):
+        return np.char.add(prefix, np.arange(num).astype(str))
+
+    table_dict = {}
+    table_dict['CBONDDESCRIPTIONZL'] = pd.DataFrame({
+        'OBJECT_ID': object_id('D', num_bond), 'S_INFO_WINDCODE': windcode,
+        'B_INFO_FULLNAME': np.char.add(np.char.add(issuer, '债券'), windcode), 'B_INFO_ISSUER': issuer,
+        'B_INFO_ISSUERCODE': issuercode, 'B_INFO_SPECIALBONDTYPE': rng.choice(['', '绿色债券', '永续债'], num_bond),
+        'B_INFO_MATURITYDATE': pd.to_datetime(get_random_datetime(rng, '2020-01-01', '2035-01-01', num_bond)).strftime('%Y%m%d'),
+        'B_INFO_COUPONRATE': rng.uniform(1, 8, num_bond).round(4), 'B_INFO_PAR': np.full(num_bond, 100.0),
+        'OPDATE': get_random_datetime(rng, '2018-01-01', '2024-01-01', num_bond)})
+
+    num_rows = row_count_dict['CBONDISSUERZL']
+    index = rng.integers(0, num_bond, num_rows)
+    table_dict['CBONDISSUERZL'] = pd.DataFrame({
+        'OBJECT_ID': object_id('I', num_rows), 'S_INFO_WINDCODE': windcode[index],
+        'S_INFO_COMPCODE': issuercode[index], 'S_INFO_COMPNAME': issuer[index],
+        'OPDATE': get_random_datetime(rng, '2018-01-01', '2024-01-01', num_rows)})
+
+    num_rows = row_count_dict['CBONDINDUSTRYWINDZL']
+    index = rng.integers(0, num_bond, num_rows)
+    table_dict['CBONDINDUSTRYWINDZL'] = pd.DataFrame({
+        'OBJECT_ID': object_id('W', num_rows), 'S_INFO_WINDCODE': windcode[index],
+        'S_INFO_INDUSTRYNAME': industry_name[index], 'S_INFO_INDUSTRYNAME2': industry_name[index],
+        'S_INFO_INDUSTRYCODE': np.char.add('6', np.char.zfill(rng.integers(0, 1000, num_rows).astype(str), 9)),
+        'OPDATE': get_random_datetime(rng, '2018-01-01', '2024-01-01', num_rows)})
+
+    num_rows = row_count_dict['CBONDDEFAULTREPORTFORM']
+    index = rng.integers(0, num_bond, num_rows)
+    table_dict['CBONDDEFAULTREPORTFORM'] = pd.DataFrame({
+        'OBJECT_ID': object_id('F', num_rows), 'B_INFO_WINDCODE': windcode[index],
+        'B_DEFAULT_DATE': pd.to_datetime(get_random_datetime(rng, '2018-01-01', '2024-06-01', num_rows)).strftime('%Y%m%d'),
+        'B_DEFAULT_AMOUNT': rng.uniform(1e6, 1e9, num_rows).round(2),
+        'B_DEFAULT_REASON': rng.choice(['未按时兑付本息', '未按时兑付利息', '触发交叉违约'], num_rows),
+        'OPDATE': get_random_datetime(rng, '2018-01-01', '2024-06-01', num_rows)})
+
+    return table_dict, windcode, issuercode, issuer
+
+
+def make_financialnews_chunk(start_id, num_rows, windcode, issuercode, issuer, news_start, news_end, rng):
+    """
+    :param start_id: OBJECT_ID of the first news
+    :param num_rows: Number of news
+    :param windcode: Bond codes mentioned by the news
+    :param issuercode: Issuer codes mentioned by the news
+    :param issuer: Issuer names, written into titles and contents
+    :param news_start: First publishdate
+    :param news_end: Last publishdate (excluded)
+    :param rng: numpy random Generator
+    :return: DataFrame of synthetic FINANCIALNEWS rows
+    """
+    index = rng.integers(0, len(windcode), num_rows)
+    # About half of the news mention no code at all, as in WDS
+    windcodes = np.char.add(np.char.add(windcode[index], ':'), issuercode[index]).astype(object)
+    windcodes[rng.random(num_rows) < 0.5] = None
+    body = rng.choice(['<p>公司公告称，', '<div>据悉，&nbsp;', '<p>市场消息显示，'], num_rows)
+    content = np.char.add(np.char.add(body, issuer[index]), '本期债券兑付存在不确定性，评级展望调整为负面。</p>' * 20)
+    return pd.DataFrame({
+        'OBJECT_ID': np.arange(start_id, start_id + num_rows),
+        'PUBLISHDATE': get_random_datetime(rng, news_start, news_end, num_rows),
+        'TITLE': np.char.add(issuer[index], rng.choice(['发布公告', '评级调整', '债券兑付提示'], num_rows)),
+        'CONTENT': content, 'WINDCODES': windcodes, 'SOURCE': rng.choice(SOURCE_LIST, num_rows),
+        'SECTIONS': rng.choice(['债券|公告', '债券', '宏观'], num_rows), 'AREACODES': rng.choice(['CN|SH', 'CN'], num_rows),
+        'INDUSTRYCODES': rng.choice(['1000|2000', '3000'], num_rows), 'MKTSENTIMENTS': rng.choice(['正面', '负面', '中性'], num_rows),
+        'NEWSLEVELS': rng.choice(['A', 'B', 'C'], num_rows),
+        'URL': np.char.add('https://news.example.com/', np.arange(start_id, start_id + num_rows).astype(str)),
+        'OPDATE': get_random_datetime(rng, news_start, news_end, num_rows)})
+
+
+def create_local_wds(db_path, row_count_dict=None, news_start='2024-01-01', news_end='2024-04-01', chunk_size=100000,
+                     seed=0):
+    """
+    :param db_path: Path of the sqlite file holding the synthetic wds schema, replaced if it exists
+    :param row_count_dict: Number of rows of each table, tables not given use DEFAULT_ROW_COUNT_DICT
+    :param news_start: First FINANCIALNEWS publishdate
+    :param news_end: Last FINANCIALNEWS publishdate (excluded)
+    :param chunk_size: FINANCIALNEWS rows generated and inserted at a time
+    :param seed: Random seed, the same seed gives the same tables
+    :return: Path of the sqlite file
+    """
+    row_count_dict = {**DEFAULT_ROW_COUNT_DICT, **(row_count_dict or {})}
+    rng = np.random.default_rng(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        table_dict, windcode, issuercode, issuer = make_bond_tables(row_count_dict, rng)
+        for table_name, dataframe in table_dict.items():
+            dataframe.to_sql(table_name, conn, index=False, chunksize=chunk_size)
+
+        num_news = row_count_dict['FINANCIALNEWS']
+        for start_id in range(0, num_news, chunk_size):
+            make_financialnews_chunk(start_id, min(chunk_size, num_news - start_id), windcode, issuercode, issuer,
+                                     news_start, news_end, rng).to_sql('FINANCIALNEWS', conn, index=False,
+                                                                       if_exists='append')
+        # Same keys as the partitioned and incremental reads use on WDS
+        conn.execute('CREATE INDEX IDX_FINANCIALNEWS_PUBLISHDATE ON FINANCIALNEWS (PUBLISHDATE)')
+        conn.commit()
+    finally:
+        conn.close()
+
+    return db_path
+
+
+class LocalWdsCursor:
+    """the part of the mysql.connector cursor used by MySqlConn and pd.read_sql, on top of a sqlite cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.description = None
+        self.list_datetime_index = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(sql, params or ())
+        # sqlite reports no column types, take them from the synthetic schema so that sql_to_parquet sees WDS types
+        if self.cursor.description is not None:
+            dict_col_type = {col: field_type for table in LOCAL_WDS_TABLE_DICT.values() for col, field_type in table.items()}
+            self.description = [(desc[0], dict_col_type.get(desc[0].upper(), FieldType.VAR_STRING)) + (None,) * 5
+                                for desc in self.cursor.description]
+            # DATETIME columns are stored as text, mysql.connector returns them as datetime
+            self.list_datetime_index = [index for index, desc in enumerate(self.description) if desc[1] == FieldType.DATETIME]
+        self.rowcount = self.cursor.rowcount
+
+    def __to_mysql_rows(self, list_tuple_data):
+        if not self.list_datetime_index:
+            return list_tuple_data
+        list_tuple_tran_data = []
+        for tuple_data in list_tuple_data:
+            list_data = list(tuple_data)
+            for index in self.list_datetime_index:
+                if list_data[index] is not None:
+                    list_data[index] = datetime.datetime.fromisoformat(list_data[index])
+            list_tuple_tran_data.append(tuple(list_data))
+        return list_tuple_tran_data
+
+    def executemany(self, sql, seq_params):
+        self.cursor.executemany(sql.replace('%s', '?'), seq_params)
+        self.rowcount = self.cursor.rowcount
+
+    def fetchmany(self, size=1):
+        return self.__to_mysql_rows(self.cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self.__to_mysql_rows(self.cursor.fetchall())
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        return row if row is None else self.__to_mysql_rows([row])[0]
+
+    def close(self):
+        self.cursor.close()
+
+
+class LocalWdsConnection:
+    """the part of the mysql.connector connection used by MySqlConn and MySqlConnPool, on top of sqlite
+
+    The sqlite file is attached as schema 'wds', so the SQL of get_data_from_mysql runs unchanged
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = None
+        self.reconnect()
+
+    def reconnect(self, attempts=1, delay=0):
+        self.close()
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.conn.execute('ATTACH DATABASE ? AS wds', (self.db_path,))
+        # MySQL REGEXP, used by the FINANCIALNEWS pushdown
+        self.conn.create_function('REGEXP', 2, lambda pattern, value: value is not None and re.search(pattern, value) is not None)
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self.conn is None:
+            if not reconnect:
+                raise mysql.connector.InterfaceError('Connection is closed')
+            self.reconnect()
+
+    def is_connected(self):
+        return self.conn is not None
+
+    def cursor(self, buffered=None):
+        if self.conn is None:
+            self.reconnect()
+        return LocalWdsCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# Serializes patching mysql.connector.connect, only one stand-in may be served at a time
+local_wds_lock = threading.Lock()
+
+
+@contextmanager
+def serve_local_wds(db_path):
+    """
+    :param db_path: Path of the sqlite file made by create_local_wds
+    :return: Context in which every mysql.connector.connect (MySqlConn, MySqlConnPool) opens the local stand-in
+    """
+    with local_wds_lock:
+        connect = mysql.connector.connect
+        mysql.connector.connect = lambda *args, **kwargs: LocalWdsConnection(db_path)
+        try:
+            yield db_path
+        finally:
+            mysql.connector.connect = connect
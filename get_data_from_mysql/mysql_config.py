@@ -22,5 +22,69 @@ class MySQL_config():
         #                    ]
         self.table_list = ['CBONDDESCRIPTIONZL', 'CBONDISSUERZL', 'CBONDINDUSTRYWINDZL', 'CBONDDEFAULTREPORTFORM', 'FINANCIALNEWS']
 
+        ### Snapshot format
+        # 'parquet': typed columns in zstd compressed row groups, readers may load only the columns and row groups
+        # they need. 'pkl.gz': the old gzip pickle, still readable by pipeline_utils.snapshot_io
+        self.snapshot_format = 'parquet'
+
+        ### Compact dtypes
+        # Tables are saved with the dtypes of pipeline_utils.table_schema: codes as categoricals, dates as Int32
+        # YYYYMMDD and numerics in their narrowest exact width. Streamed tables are saved as fetched
+        self.compact_dtypes = True
+
+        ### Snapshot deduplication
+        # Every extracted table is fingerprinted (sha256, see pipeline_utils.snapshot_io) and hard linked to a blob
+        # named by its fingerprint, a table unchanged since an earlier month is stored only once on disk.
+        # blob_dir must be on the same file system as save_home_dir
+        self.dedup_snapshot = True
+        self.blob_dir = '/mnt/utnfs/data/sentiment_score_pipeline/data/raw_data/updated_data/cbond_blobs'
+
+        ### Column projection
+        # Tables declared in pipeline_utils.column_manifest are selected with only the columns the stages read
+        self.column_projection = True
+
+        ### FINANCIALNEWS predicate pushdown
+        # None: select every news of the month. 'windcodes': drop news with empty WINDCODES on the server.
+        # 'whitelist': also keep only news whose WINDCODES mention a code of the latest bond profile (bonds first
+        # seen this month are not in that profile yet, their news is dropped too)
+        self.financialnews_pushdown = None
+        self.bond_profile_dir = '/mnt/utnfs/data/sentiment_score_pipeline/data/processed_data/v0.1.0/features_data/bond_profile'
+        self.pushdown_regexp_batch_size = 1000
+
+        ### Incremental extraction
+        # Tables below are only pulled for rows whose watermark column is not earlier than last snapshot's watermark,
+        # and then merged into last snapshot by key columns. Set incremental_extract to False to force a full pull
+        # (rows deleted in the DB are only dropped by a full pull).
+        self.incremental_extract = True
+        self.incremental_table_dict = {'CBONDDESCRIPTIONZL': {'watermark_col': 'OPDATE', 'key_cols': ['OBJECT_ID']},
+                                       'CBONDISSUERZL': {'watermark_col': 'OPDATE', 'key_cols': ['OBJECT_ID']},
+                                       'CBONDINDUSTRYWINDZL': {'watermark_col': 'OPDATE', 'key_cols': ['OBJECT_ID']},
+                                       'CBONDDEFAULTREPORTFORM': {'watermark_col': 'OPDATE', 'key_cols': ['OBJECT_ID']}}
+        self.watermark_suffix = '.watermark.json'
+
+        ### Streaming extraction
+        # Tables below are fetched through an unbuffered cursor chunk by chunk, and each chunk is written into
+        # <table>.parquet as one row group, so peak memory does not grow with the table size
+        self.stream_extract = True
+        self.stream_table_list = ['CBONDPRICESNET', 'FINANCIALNEWS']
+        self.stream_chunk_size = 200000
+
+        ### Parallel extraction
+        # Tables are downloaded by threads sharing one connection pool, max_connections is the limit of connections
+        # opened on the server at the same time. A failed table is retried after extract_retry_backoff seconds,
+        # doubled after each failure
+        self.parallel_extract = True
+        self.max_connections = 4
+        self.extract_retry = 3
+        self.extract_retry_backoff = 10
+
+        ### Partitioned extraction
+        # Tables below are split into key ranges on the given column and the ranges are read over several pooled
+        # connections at the same time. One partition per partition_rows rows, at most partition_max_num partitions
+        self.partition_extract = True
+        self.partition_table_dict = {'CBONDPRICESNET': 'TRADE_DT', 'FINANCIALNEWS': 'PUBLISHDATE'}
+        self.partition_rows = 500000
+        self.partition_max_num = 8
+
 if __name__ == '__main__':
     config = MySQL_config()
@@ -1,8 +1,16 @@
 import pandas as pd
 import time
 import mysql.connector
-import math
+import csv
+import os
+import queue
+import tempfile
+import threading
+from contextlib import contextmanager
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from mysql.connector import FieldType
 
 
 class MySqlConn:
@@ -10,12 +18,27 @@ class MySqlConn:
 
     def __init__(self, host, user, pw, port, mode,
                  num_dev_sample=100,
-                 is_debug=False, is_hide_message=False):
-        self.conn = mysql.connector.connect(host=host, user=user, password=pw, port=port, buffered=True)
+                 is_debug=False, is_hide_message=False, conn=None):
+        # a connection handed over by MySqlConnPool stays open between queries, the pool checks its health
+        self.is_pooled = conn is not None
+        if conn is None:
+            conn = mysql.connector.connect(host=host, user=user, password=pw, port=port, buffered=True)
+        self.conn = conn
+        # kept to open the dedicated LOCAL INFILE connection of a bulk load
+        self.host = host
+        self.user = user
+        self.pw = pw
+        self.port = port
         self.dict_type_py_to_mysql = {'object': 'VARCHAR(255)',
                                       'int64': 'INT', 'int32': 'INT',
                                       'float64': 'FLOAT(32)',
                                       'datetime64[ns]': 'DATE'}
+        self.dict_type_mysql_to_arrow = {'TINY': pa.int64(), 'SHORT': pa.int64(), 'LONG': pa.int64(),
+                                         'INT24': pa.int64(), 'LONGLONG': pa.int64(), 'YEAR': pa.int64(),
+                                         'FLOAT': pa.float64(), 'DOUBLE': pa.float64(),
+                                         'DECIMAL': pa.float64(), 'NEWDECIMAL': pa.float64(),
+                                         'DATETIME': pa.timestamp('us'), 'TIMESTAMP': pa.timestamp('us'),
+                                         'DATE': pa.date32(), 'NEWDATE': pa.date32()}
         self.mode = mode
         self.num_dev_sample = num_dev_sample
 
@@ -24,6 +47,8 @@ class MySqlConn:
 
     def __manage_conn(method):
         def manage_conn(self, *args, **kwargs):
+            if self.is_pooled:
+                return method(self, *args, **kwargs)
             self.conn.reconnect(attempts=20, delay=3)
             return_ = method(self, *args, **kwargs)
             self.conn.close()
@@ -65,25 +90,70 @@ class MySqlConn:
             print(sql)
         return pd.read_sql(sql, con=self.conn)
 
+    @__manage_conn
+    @__time_it
+    def sql_to_parquet(self, sql, file_path, chunk_size=200000, is_lower_col=False):
+        """stream the result through an unbuffered cursor, each chunk is written into file_path as one row group"""
+        if self.mode == 'dev':
+            print('you are in dev mode!')
+            sql = f'{sql} LIMIT {self.num_dev_sample}'
+        if self.is_debug:
+            print(sql)
+
+        # unbuffered cursor: rows stay on the server side until fetched
+        self.cursor = self.conn.cursor(buffered=False)
+        self.cursor.execute(sql)
+
+        list_col = [desc[0].lower() if is_lower_col else desc[0] for desc in self.cursor.description]
+        # fix the schema from the result set description, so that chunks with all null columns keep the same types
+        schema = pa.schema([(col, self.dict_type_mysql_to_arrow.get(FieldType.get_info(desc[1]), pa.string()))
+                            for col, desc in zip(list_col, self.cursor.description)])
+
+        # write into a temp file first, a broken stream should never leave a partial table behind
+        temp_file_path = file_path + '.tmp'
+        num_rows = 0
+        writer = pq.ParquetWriter(temp_file_path, schema, compression='zstd')
+        try:
+            while True:
+                list_tuple_data = self.cursor.fetchmany(chunk_size)
+                if not list_tuple_data:
+                    break
+                df_chunk = pd.DataFrame.from_records(list_tuple_data, columns=list_col, coerce_float=True)
+                writer.write_table(pa.Table.from_pandas(df_chunk, schema=schema, preserve_index=False))
+                num_rows += len(list_tuple_data)
+        except Exception:
+            writer.close()
+            os.remove(temp_file_path)
+            raise
+        writer.close()
+        os.replace(temp_file_path, file_path)
+
+        if not self.is_hide_message:
+            print(f"{num_rows} row were written in {file_path}")
+
+        return num_rows
+
     def get_whole_table(self, schema, table):
         return self.sql_to_df(f"SELECT * FROM {schema}.{table}")
 
+    def get_rows_since(self, schema, table, col, value, cols=None):
+        cols_str = ', '.join(cols) if cols else '*'
+        return self.sql_to_df(f"SELECT {cols_str} FROM {schema}.{table} WHERE {col} >= '{value}'")
+
     def get_schema_table_list(self, schema):
         cursor = self.conn.cursor()
         cursor.execute(f"USE {schema}")
         return self.sql_to_df("SHOW TABLES")
 
-    def get_date_range(self, schema, table, col):
-        cursor = self.conn.cursor()
-        cursor.execute(f"USE {schema}")
-        return self.sql_to_df(f"SELECT min({col}), max({col}) from {table} ")
+    def get_date_range(self, schema, table, col, where=None):
+        # qualify the table with schema, a 'USE schema' would be lost when sql_to_df reconnects
+        str_where = f"WHERE {where}" if where else ''
+        return self.sql_to_df(f"SELECT min({col}), max({col}) from {schema}.{table} {str_where}")
 
-    def get_row_count(self, schema, table):
-        cursor = self.conn.cursor()
-        cursor.execute(f"USE {schema}")
-        cursor.execute(f"SELECT COUNT(*) from {table} ")
-        count = cursor.fetchall()
-        return count[0][0]
+    def get_row_count(self, schema, table, where=None):
+        str_where = f"WHERE {where}" if where else ''
+        count = self.sql_to_df(f"SELECT COUNT(*) from {schema}.{table} {str_where}")
+        return int(count.iloc[0, 0])
 
     def get_selected_columns(self, schema, table, cols):
         cols_str = ', '.join(cols)
@@ -132,41 +202,127 @@ class MySqlConn:
 
     @__manage_conn
     @__time_it
-    def insert_data(self, df, schema, table, chunk_size=5000):
+    def insert_data(self, df, schema, table, chunk_size=5000, is_bulk_load=False, is_replace=False):
+        """
+        is_bulk_load: stream df through LOAD DATA LOCAL INFILE into a staging table, then move it into the table,
+                      fall back to executemany if the server refuses to load local files
+        is_replace: swap the loaded table in place of the table (bulk load), or empty the table in the same
+                    transaction as the insert (executemany), instead of appending to it
+        """
+
+        # py format --> mysql format
+        self.__py_dt_to_mysql_dt(df)
+
+        if is_bulk_load:
+            try:
+                self.__load_data_local_infile(df, schema, table, is_replace)
+                return
+            except mysql.connector.Error as e:
+                if not self.is_hide_message:
+                    print(f"[!] LOAD DATA LOCAL INFILE into {schema}.{table} failed ({e}), fall back to executemany")
 
         str_tuple_col = str(tuple(df.columns.tolist())).replace("'", "").replace(',)', ')')
         str_tuple_input = str(tuple(["%s" for col in df])).replace("'", "").replace(',)', ')')
+        str_query = f"INSERT INTO {schema}.{table} {str_tuple_col} VALUES {str_tuple_input}"
 
-        # py format --> mysql format
-        self.__py_dt_to_mysql_dt(df)
+        if self.is_debug:
+            print(str_query)
 
         list_df_chunk = self.__split_df(df, chunk_size)
 
+        self.cursor = self.conn.cursor()
+        if is_replace:
+            # DELETE (not TRUNCATE, which commits implicitly) is undone with the insert if a chunk fails
+            self.cursor.execute(f"DELETE FROM {schema}.{table}")
+        num_rows = 0
         for df_chunk in list_df_chunk:
 
-            list_tuple_data = list(df_chunk.to_records(index=False))
-            list_tuple_data = self.__py_num_to_mysql_num(df_chunk, list_tuple_data)
+            list_tuple_data = self.__py_num_to_mysql_num(df_chunk)
 
-            str_query = f"INSERT INTO {schema}.{table} {str_tuple_col} VALUES {str_tuple_input}"
+            self.cursor.executemany(str_query, list_tuple_data)
+            num_rows += len(list_tuple_data)
 
-            if self.is_debug:
-                print(str_query)
+        # one commit for the whole df, a failed chunk leaves nothing half inserted
+        self.conn.commit()
 
-            self.cursor = self.conn.cursor()
-            self.cursor.executemany(str_query, list_tuple_data)
-            self.conn.commit()
+        if not self.is_hide_message:
+            print(f"{num_rows} row were inserted in {schema}.{table}")
 
-            if not self.is_hide_message:
-                print(f"{self.cursor.rowcount} row were inserted in {schema}.{table}")
+    def __load_data_local_infile(self, df, schema, table, is_replace=False):
+        """
+        write df into a tab separated temp file, load it into <table>__staging and move the rows into table
+        raise mysql.connector.Error if the rows are not in table, the schema is then left as it was
+        """
+        str_col = ', '.join(df.columns)
+        staging_table = f'{table}__staging'
+        old_table = f'{table}__old'
+
+        # NULL is \N, backslash, tab and line breaks in strings are escaped the way LOAD DATA expects
+        df_file = df.copy()
+        for col, dtype in df_file.dtypes.astype(str).items():
+            if dtype == 'object':
+                df_file[col] = df_file[col].where(df_file[col].isna(), df_file[col].astype(str)
+                                                  .str.replace('\\', '\\\\', regex=False)
+                                                  .str.replace('\t', '\\t', regex=False)
+                                                  .str.replace('\n', '\\n', regex=False)
+                                                  .str.replace('\r', '\\r', regex=False))
+            elif dtype == 'bool':
+                df_file[col] = df_file[col].astype(int)
+
+        # LOCAL INFILE lets the server read files of this machine, it is only allowed on a connection opened for this load
+        conn = mysql.connector.connect(host=self.host, user=self.user, password=self.pw, port=self.port, buffered=True,
+                                       allow_local_infile=True)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.tsv', encoding='utf-8', delete=False) as file:
+            file_path = file.name
+        try:
+            df_file.to_csv(file_path, sep='\t', header=False, index=False, na_rep='\\N',
+                           quoting=csv.QUOTE_NONE, lineterminator='\n', encoding='utf-8')
+
+            self.cursor = conn.cursor()
+            list_query = [f"DROP TABLE IF EXISTS {schema}.{staging_table}",
+                          f"CREATE TABLE {schema}.{staging_table} LIKE {schema}.{table}",
+                          f"LOAD DATA LOCAL INFILE '{file_path}' INTO TABLE {schema}.{staging_table} "
+                          f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({str_col})"]
+            if is_replace:
+                # a <table>__old left by an interrupted load would make the RENAME fail, the table itself is complete
+                # (RENAME TABLE swaps both tables in one atomic step, readers never see a half loaded table)
+                list_query += [f"DROP TABLE IF EXISTS {schema}.{old_table}",
+                               f"RENAME TABLE {schema}.{table} TO {schema}.{old_table}, "
+                               f"{schema}.{staging_table} TO {schema}.{table}"]
+            else:
+                list_query += [f"INSERT INTO {schema}.{table} ({str_col}) SELECT {str_col} FROM {schema}.{staging_table}"]
+
+            # nothing is in table until the RENAME or the commit of the INSERT, a failure before falls back cleanly
+            for str_query in list_query:
+                if self.is_debug:
+                    print(str_query)
+                self.cursor.execute(str_query)
+            conn.commit()
+        finally:
+            os.remove(file_path)
+            # DDL commits implicitly, a rollback does not remove the staging or the old table: drop them in any case
+            list_cleanup_query = [f"DROP TABLE IF EXISTS {schema}.{staging_table}"]
+            if is_replace:
+                list_cleanup_query.append(f"DROP TABLE IF EXISTS {schema}.{old_table}")
+            for str_query in list_cleanup_query:
+                try:
+                    conn.cursor().execute(str_query)
+                except mysql.connector.Error as e:
+                    if not self.is_hide_message:
+                        print(f"[!] {str_query} failed ({e}), drop it by hand")
+            conn.close()
+
+        if not self.is_hide_message:
+            print(f"{len(df)} row were loaded in {schema}.{table}")
 
     def try_create_insert_table(self, df, schema, table, chunk_size=5000,
-                                dict_type_py_to_mysql=None, dict_type_col_to_mysql=None, ):
+                                dict_type_py_to_mysql=None, dict_type_col_to_mysql=None, is_bulk_load=False):
 
         if dict_type_py_to_mysql is None:
             dict_type_py_to_mysql = self.dict_type_py_to_mysql
 
         self.try_create_table(df, schema, table, dict_type_py_to_mysql, dict_type_col_to_mysql)
-        self.insert_data(df, schema, table, chunk_size=chunk_size)
+        self.insert_data(df, schema, table, chunk_size=chunk_size, is_bulk_load=is_bulk_load)
 
     @__manage_conn
     @__time_it
@@ -178,36 +334,31 @@ class MySqlConn:
         self.cursor.execute(str_query)
 
     @staticmethod
-    def __py_num_to_mysql_num(df, list_tuple_data):
+    def __py_num_to_mysql_num(df):
         """
+        column by column instead of cell by cell
         nan --> None
         int64, int32 --> int
         float64 --> float
         """
 
-        arr_dtypes = df.dtypes.astype(str).values
-        list_index_convert_int = [index for index, dtype in enumerate(arr_dtypes) if dtype in ['int64', 'int32']]
-        list_index_convert_float = [index for index, dtype in enumerate(arr_dtypes) if dtype in ['float64']]
-
-        list_tuple_tran_data = []
-
-        for tuple_data in list_tuple_data:
-
-            list_tran_data = []
-            for index, data in enumerate(tuple_data):
-                # mysql do not accept np.nan but accept None"
-                if isinstance(data, float) and math.isnan(data):
-                    data = None
-                elif index in list_index_convert_int:
-                    data = int(data)
-                elif index in list_index_convert_float:
-                    data = float(data)
-
-                list_tran_data.append(data)
-
-            list_tuple_tran_data.append(tuple(list_tran_data))
+        list_col_data = []
+        for col, dtype in df.dtypes.astype(str).items():
+            arr_data = df[col].to_numpy()
+            # astype(object) turns numpy numbers into python int / float
+            if dtype in ['int64', 'int32']:
+                arr_data = arr_data.astype(np.int64).astype(object)
+            elif dtype in ['float64']:
+                arr_mask = np.isnan(arr_data)
+                arr_data = arr_data.astype(np.float64).astype(object)
+                # mysql do not accept np.nan but accept None
+                arr_data[arr_mask] = None
+            else:
+                arr_data = arr_data.astype(object)
+                arr_data[pd.isna(arr_data)] = None
+            list_col_data.append(arr_data)
 
-        return list_tuple_tran_data
+        return list(zip(*list_col_data))
 
     @staticmethod
     def __py_dt_to_mysql_dt(df):
@@ -227,3 +378,53 @@ class MySqlConn:
         for i in range(num_chunks):
             list_chunks.append(df[i * chunk_size:(i + 1) * chunk_size])
         return list_chunks
+
+
+class MySqlConnPool:
+    """bounded pool of connections to one server, at most pool_size queries run on the server at the same time"""
+
+    def __init__(self, host, user, pw, port, mode, pool_size=4, **kwargs):
+        self.host = host
+        self.user = user
+        self.pw = pw
+        self.port = port
+        self.mode = mode
+        self.kwargs = kwargs
+
+        self.pool_size = pool_size
+        self.semaphore = threading.BoundedSemaphore(pool_size)
+        self.idle_conns = queue.LifoQueue()
+
+    def __get_healthy_conn(self):
+        """reuse an idle connection if it still answers a ping, otherwise open a new one"""
+        while True:
+            try:
+                conn = self.idle_conns.get_nowait()
+            except queue.Empty:
+                return mysql.connector.connect(host=self.host, user=self.user, password=self.pw, port=self.port,
+                                               buffered=True)
+            try:
+                conn.ping(reconnect=True, attempts=3, delay=1)
+                return conn
+            except mysql.connector.Error:
+                conn.close()
+
+    @contextmanager
+    def get_conn(self):
+        """block until one of the pool_size slots is free, then lend a MySqlConn bound to a healthy connection"""
+        with self.semaphore:
+            conn = self.__get_healthy_conn()
+            try:
+                yield MySqlConn(self.host, self.user, self.pw, self.port, self.mode, conn=conn, **self.kwargs)
+            except Exception:
+                # the connection may be left in the middle of a result set, do not hand it out again
+                conn.close()
+                raise
+            self.idle_conns.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle_conns.get_nowait().close()
+            except queue.Empty:
+                break
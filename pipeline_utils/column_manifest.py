@@ -0,0 +1,38 @@
+# Raw WDS columns read by each stage, keyed by stage and then by table (lower case, as saved in cbond_tables).
+# get_data_from_mysql selects only the union of the columns declared for a table, so a stage has to declare here
+# every raw column it reads. Tables declared by no stage are still selected with all columns.
+RAW_COLUMN_MANIFEST = {
+    'generate_bond_profile_features': {
+        'cbonddescriptionzl': ['s_info_windcode', 'b_info_specialbondtype', 'b_info_issuercode', 'b_info_fullname',
+                               'b_info_issuer', 'b_info_maturitydate'],
+        'cbondissuerzl': ['s_info_windcode', 's_info_compcode'],
+        'cbondindustrywindzl': ['s_info_windcode', 's_info_industryname', 's_info_industryname2'],
+        'cbonddefaultreportform': ['b_info_windcode', 'b_default_date'],
+    },
+    'generate_origin_news': {
+        'financialnews': ['publishdate', 'title', 'content', 'windcodes', 'source', 'sections', 'areacodes',
+                          'industrycodes', 'mktsentiments', 'newslevels'],
+    },
+}
+
+
+def get_stage_columns(stage, table_name):
+    """
+    :param stage: Name of the stage, e.g. 'generate_origin_news'
+    :param table_name: Name of the raw table
+    :return: Raw columns of the table read by the stage
+    """
+    return list(RAW_COLUMN_MANIFEST[stage][table_name.lower()])
+
+
+def get_extract_columns(table_name, required_cols=None):
+    """
+    :param table_name: Name of the raw table
+    :param required_cols: Columns the extractor itself needs, e.g. watermark or partition columns
+    :return: Upper case union of the columns declared by all stages and required_cols, None if no stage declares the table
+    """
+    declared_cols = [col for stage_manifest in RAW_COLUMN_MANIFEST.values()
+                     for col in stage_manifest.get(table_name.lower(), [])]
+    if not declared_cols:
+        return None
+    return list(dict.fromkeys(col.upper() for col in declared_cols + list(required_cols or [])))
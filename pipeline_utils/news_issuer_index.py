@@ -0,0 +1,121 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Inverted index between news and issuers, one directory per data version, each array saved as .npy:
+#   news_ids: sorted News_ID (bytes), issuercodes: sorted b_info_issuercode (bytes)
+#   issuer_indptr / issuer_news: news positions of issuer i are issuer_news[issuer_indptr[i]:issuer_indptr[i + 1]] (sorted)
+#   news_indptr / news_issuers: issuer positions of news j are news_issuers[news_indptr[j]:news_indptr[j + 1]] (sorted)
+# Positions are int32, the index is loaded memory mapped so that a query only reads the pages it needs.
+INDEX_ARRAY_LIST = ['news_ids', 'issuercodes', 'issuer_indptr', 'issuer_news', 'news_indptr', 'news_issuers']
+
+
+def get_csr(row, col, num_rows):
+    """
+    :param row: int array, row of each pair
+    :param col: int array, column of each pair
+    :param num_rows: number of rows
+    :return: (indptr, indices), the columns of each row sorted
+    """
+    order = np.lexsort((col, row))
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row, minlength=num_rows), out=indptr[1:])
+    return indptr, col[order].astype(np.int32)
+
+
+def build_news_issuer_index(news_ids, issuercode_lists):
+    """
+    :param news_ids: News_ID of each news
+    :param issuercode_lists: list of b_info_issuercode of each news
+    :return: dict of the arrays of INDEX_ARRAY_LIST
+    """
+    pairs = pd.DataFrame({'News_ID': pd.Series(news_ids, dtype=object).astype(str).to_numpy(),
+                          'b_info_issuercode': list(issuercode_lists)}).explode('b_info_issuercode')
+    # News without issuer are still listed in news_ids, with no issuer
+    all_news_ids = np.unique(pairs['News_ID'].to_numpy().astype(bytes))
+    pairs = pairs.dropna().astype(str).drop_duplicates()
+    issuercodes = np.unique(pairs['b_info_issuercode'].to_numpy().astype(bytes))
+
+    news_position = np.searchsorted(all_news_ids, pairs['News_ID'].to_numpy().astype(bytes))
+    issuer_position = np.searchsorted(issuercodes, pairs['b_info_issuercode'].to_numpy().astype(bytes))
+    issuer_indptr, issuer_news = get_csr(issuer_position, news_position, len(issuercodes))
+    news_indptr, news_issuers = get_csr(news_position, issuer_position, len(all_news_ids))
+    return {'news_ids': all_news_ids, 'issuercodes': issuercodes, 'issuer_indptr': issuer_indptr,
+            'issuer_news': issuer_news, 'news_indptr': news_indptr, 'news_issuers': news_issuers}
+
+
+def save_news_issuer_index(index, index_dir):
+    """
+    :param index: build_news_issuer_index dict
+    :param index_dir: Directory of the index of one data version
+    :return: None
+    """
+    if not os.path.exists(index_dir):
+        os.makedirs(index_dir)
+    for array_name in INDEX_ARRAY_LIST:
+        # Write into temp files first, a reader never maps a half written array
+        temp_path = os.path.join(index_dir, array_name + '.npy.tmp')
+        with open(temp_path, 'wb') as f:
+            np.save(f, index[array_name])
+        os.replace(temp_path, os.path.join(index_dir, array_name + '.npy'))
+
+
+def load_news_issuer_index(index_dir):
+    """
+    :param index_dir: Directory of the index of one data version
+    :return: dict of the arrays of INDEX_ARRAY_LIST, memory mapped
+    """
+    return {array_name: np.load(os.path.join(index_dir, array_name + '.npy'), mmap_mode='r')
+            for array_name in INDEX_ARRAY_LIST}
+
+
+def get_position(sorted_values, value):
+    """
+    :param sorted_values: sorted bytes array
+    :param value: value to look up
+    :return: position of value in sorted_values, -1 if it is not there
+    """
+    value = str(value).encode()
+    position = np.searchsorted(sorted_values, value)
+    if position < len(sorted_values) and sorted_values[position] == value:
+        return int(position)
+    return -1
+
+
+def get_issuer_news(index, issuercode):
+    """
+    :param index: build_news_issuer_index or load_news_issuer_index dict
+    :param issuercode: b_info_issuercode
+    :return: sorted list of the News_ID linked to the issuer
+    """
+    position = get_position(index['issuercodes'], issuercode)
+    if position < 0:
+        return []
+    news = index['issuer_news'][index['issuer_indptr'][position]:index['issuer_indptr'][position + 1]]
+    return index['news_ids'][news].astype(str).tolist()
+
+
+def get_news_issuers(index, news_id):
+    """
+    :param index: build_news_issuer_index or load_news_issuer_index dict
+    :param news_id: News_ID
+    :return: sorted list of the b_info_issuercode linked to the news
+    """
+    position = get_position(index['news_ids'], news_id)
+    if position < 0:
+        return []
+    issuers = index['news_issuers'][index['news_indptr'][position]:index['news_indptr'][position + 1]]
+    return index['issuercodes'][issuers].astype(str).tolist()
+
+
+def get_issuers_news(index, issuercodes):
+    """
+    :param index: build_news_issuer_index or load_news_issuer_index dict
+    :param issuercodes: list of b_info_issuercode
+    :return: sorted list of the News_ID linked to any of the issuers
+    """
+    news_list = [index['issuer_news'][index['issuer_indptr'][position]:index['issuer_indptr'][position + 1]]
+                 for position in (get_position(index['issuercodes'], code) for code in issuercodes) if position >= 0]
+    if len(news_list) == 0:
+        return []
+    return index['news_ids'][np.unique(np.concatenate(news_list))].astype(str).tolist()
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+
+# Store of the news contents processed by earlier runs, two arrays of the same length saved as .npy:
+#   fingerprints: uint64, one per distinct (content, data version) pair
+#   versions: int32 YYYYMMDD, a data version whose news had that content
+# Sorted by (fingerprint, version), so the first entry of a fingerprint holds its earliest version. Every version of a
+# content is kept: running a version again replaces only its own entries. 12 bytes per pair, loaded memory mapped so
+# that opening the store does not read it.
+FINGERPRINT_FILE = 'seen_content_fingerprints.npy'
+VERSION_FILE = 'seen_content_versions.npy'
+
+
+def to_version_number(data_version):
+    """
+    :param data_version: Data version as 'YYYY-MM-DD', e.g. the folder name under cbond_tables
+    :return: YYYYMMDD integer
+    """
+    return int(str(data_version).replace('-', ''))
+
+
+def load_seen_content(store_dir):
+    """
+    :param store_dir: Directory of the store
+    :return: (fingerprints, versions) arrays, memory mapped, empty when nothing is stored yet
+    """
+    fingerprint_path = os.path.join(store_dir, FINGERPRINT_FILE)
+    version_path = os.path.join(store_dir, VERSION_FILE)
+    if not (os.path.exists(fingerprint_path) and os.path.exists(version_path)):
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int32)
+    return np.load(fingerprint_path, mmap_mode='r'), np.load(version_path, mmap_mode='r')
+
+
+def is_seen_content(fingerprints, store_dir, data_version):
+    """
+    :param fingerprints: uint64 array of content fingerprints to look up
+    :param store_dir: Directory of the store
+    :param data_version: Data version being processed, only contents stored by earlier versions count as seen
+        --> Running a version again never finds its own news
+    :return: bool array, True for contents already processed by an earlier version
+    """
+    stored_fingerprints, stored_versions = load_seen_content(store_dir)
+    fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+    if len(stored_fingerprints) == 0:
+        return np.zeros(len(fingerprints), dtype=bool)
+    # Binary search in the sorted array, only the pages holding the searched positions are read from disk.
+    # side='left' finds the first entry of each fingerprint, the one with its earliest version
+    position = np.minimum(np.searchsorted(stored_fingerprints, fingerprints, side='left'), len(stored_fingerprints) - 1)
+    return (stored_fingerprints[position] == fingerprints) & (stored_versions[position] < to_version_number(data_version))
+
+
+def update_seen_content(fingerprints, store_dir, data_version):
+    """
+    :param fingerprints: uint64 array of the fingerprints of the contents processed by this version
+    :param store_dir: Directory of the store
+    :param data_version: Data version being processed
+    :return: Number of (content, version) pairs in the store. The fingerprints stored before by this version are replaced,
+        the entries of the other versions are kept
+    """
+    version = to_version_number(data_version)
+    stored_fingerprints, stored_versions = load_seen_content(store_dir)
+    is_other_version = np.asarray(stored_versions) != version
+    fingerprints = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+    versions = np.concatenate([stored_versions[is_other_version], np.full(len(fingerprints), version, dtype=np.int32)])
+    fingerprints = np.concatenate([stored_fingerprints[is_other_version], fingerprints])
+
+    order = np.lexsort((versions, fingerprints))
+    fingerprints, versions = fingerprints[order], versions[order]
+
+    # Write into temp files first, the memory mapped store of a reader is never overwritten in place
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+    for file_name, array in [(FINGERPRINT_FILE, fingerprints), (VERSION_FILE, versions)]:
+        temp_path = os.path.join(store_dir, file_name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, os.path.join(store_dir, file_name))
+    return len(fingerprints)
@@ -0,0 +1,110 @@
+import os
+import uuid
+import pickle
+import tempfile
+import pandas as pd
+import pyarrow as pa
+
+# Frames handed to joblib workers are written once as uncompressed Arrow IPC files in shared memory (tmpfs), each task
+# only pickles a SharedFrame (a path) and the worker memory maps the file. What is saved is the transfer: the data is
+# neither pickled by the parent nor sent through the worker pipe for every task. The worker still builds its own pandas
+# objects from the map (see attach_frame), only the numeric columns of cached frames stay views of the shared memory.
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Frames attached with cache=True, kept by each worker process for the next tasks of the stage
+ATTACHED_FRAME_DICT = {}
+
+
+class SharedFrame():
+    def __init__(self, path, kind='frame', cache=False):
+        """
+        :param path: Arrow IPC file in shared memory
+        :param kind: 'frame', 'list', 'series' or 'object', what was published and is attached back
+        :param cache: True for read-only references (e.g. bond_profile) attached once per worker process
+        """
+        self.path = path
+        self.kind = kind
+        self.cache = cache
+
+
+def publish_frame(dataframe, name, cache=False):
+    """
+    :param dataframe: DataFrame, Series published with its index as the first column, list published as a one column table,
+        or any other picklable object (e.g. a compiled automaton) published as its pickle
+    :param name: Prefix of the file name, e.g. 'bond_profile'
+    :param cache: True for read-only references shared by all tasks of the stage
+    :return: SharedFrame to pass to the workers instead of the DataFrame
+    """
+    if not isinstance(dataframe, (pd.DataFrame, pd.Series, list, tuple)):
+        path = os.path.join(SHARED_MEMORY_DIR, f'{name}_{os.getpid()}_{uuid.uuid4().hex}.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump(dataframe, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return SharedFrame(path, 'object', cache)
+    if isinstance(dataframe, pd.DataFrame):
+        kind = 'frame'
+    elif isinstance(dataframe, pd.Series):
+        kind = 'series'
+        dataframe = pd.DataFrame({'index': dataframe.index, 'value': dataframe.to_numpy()})
+    else:
+        kind = 'list'
+        dataframe = pd.DataFrame({'value': list(dataframe)})
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    path = os.path.join(SHARED_MEMORY_DIR, f'{name}_{os.getpid()}_{uuid.uuid4().hex}.arrow')
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return SharedFrame(path, kind, cache)
+
+
+def attach_frame(shared_frame):
+    """
+    :param shared_frame: SharedFrame made by publish_frame
+    :return: The published DataFrame, Series, list or object, built in the worker from the shared memory file:
+        - cached frames keep their numeric columns as read-only views of the map (split_blocks), string columns are copied
+        - other frames are copied into ordinary (writable) DataFrames by to_pandas
+        - lists, the index of a Series and objects (unpickled) are rebuilt as Python objects
+        Cached references are built once per worker process and kept for all its tasks, e.g. a Series keeps its index and
+        so the hash table of the index, an object such as the issuer automaton is unpickled once per worker
+    """
+    if shared_frame.path in ATTACHED_FRAME_DICT:
+        return ATTACHED_FRAME_DICT[shared_frame.path]
+    if shared_frame.kind == 'object':
+        with open(shared_frame.path, 'rb') as f:
+            dataframe = pickle.load(f)
+    else:
+        # The Arrow buffers keep the map alive, it is unmapped once the frame is dropped
+        table = pa.ipc.open_file(pa.memory_map(shared_frame.path, 'r')).read_all()
+        if shared_frame.kind == 'list':
+            dataframe = table.column('value').to_pylist()
+        elif shared_frame.kind == 'series':
+            dataframe = pd.Series(table.column('value').to_numpy(zero_copy_only=False), index=pd.Index(table.column('index').to_pylist()))
+        elif shared_frame.cache:
+            dataframe = table.to_pandas(split_blocks=True)
+        else:
+            dataframe = table.to_pandas()
+    if shared_frame.cache:
+        # loky keeps its workers over the stages, drop the references of stages that released them
+        for path in [path for path in ATTACHED_FRAME_DICT if not os.path.exists(path)]:
+            del ATTACHED_FRAME_DICT[path]
+        ATTACHED_FRAME_DICT[shared_frame.path] = dataframe
+    return dataframe
+
+
+def run_with_shared(func, *args):
+    """
+    :param func: Function run in the worker
+    :param args: Arguments of func, SharedFrame arguments are attached first
+    :return: Result of func
+    """
+    return func(*[attach_frame(arg) if isinstance(arg, SharedFrame) else arg for arg in args])
+
+
+def release_frames(shared_frame_list):
+    """
+    :param shared_frame_list: SharedFrames published by the stage
+    :return: None. The shared memory files are removed, workers still holding a map keep it until they drop it
+    """
+    for shared_frame in shared_frame_list:
+        ATTACHED_FRAME_DICT.pop(shared_frame.path, None)
+        if os.path.exists(shared_frame.path):
+            os.remove(shared_frame.path)
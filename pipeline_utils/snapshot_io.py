@@ -0,0 +1,222 @@
+import os
+import gzip
+import json
+import hashlib
+import pickle
+import shutil
+import operator
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Suffixes in reading priority, a table is read from parquet when it exists and from the old pkl.gz otherwise
+SNAPSHOT_SUFFIX_DICT = {'parquet': '.parquet', 'pkl.gz': '.pkl.gz'}
+
+# Sidecar next to each deduplicated table, holding the sha256 of its content
+FINGERPRINT_SUFFIX = '.fingerprint.json'
+
+FILTER_OPERATOR_DICT = {'=': operator.eq, '==': operator.eq, '!=': operator.ne,
+                        '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+                        'in': lambda col, value: col.isin(value), 'not in': lambda col, value: ~col.isin(value)}
+
+
+def get_snapshot_path(snapshot_dir, table_name):
+    """
+    :param snapshot_dir: Snapshot directory, e.g. cbond_tables/<date>
+    :param table_name: Name of the table
+    :return: Path of the table inside the snapshot, None if the table is not in the snapshot
+    """
+    for suffix in SNAPSHOT_SUFFIX_DICT.values():
+        path = os.path.join(snapshot_dir, table_name.lower() + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def write_snapshot_table(dataframe, snapshot_dir, table_name, snapshot_format='parquet', row_group_size=100000):
+    """
+    :param dataframe: Table to save
+    :param snapshot_dir: Snapshot directory, e.g. cbond_tables/<date>
+    :param table_name: Name of the table
+    :param snapshot_format: 'parquet' (typed columns, zstd compressed row groups) or 'pkl.gz'
+    :param row_group_size: Rows in each parquet row group, the unit skipped by row filters
+    :return: Path of the saved table
+    """
+    if snapshot_format not in SNAPSHOT_SUFFIX_DICT:
+        raise ValueError(f'Unknown snapshot format: {snapshot_format}')
+    if not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir)
+    save_path = os.path.join(snapshot_dir, table_name.lower() + SNAPSHOT_SUFFIX_DICT[snapshot_format])
+
+    # Write into a temp file first, readers never see a half written table
+    temp_path = save_path + '.tmp'
+    if snapshot_format == 'parquet':
+        pq.write_table(pa.Table.from_pandas(dataframe, preserve_index=False), temp_path,
+                       compression='zstd', row_group_size=row_group_size)
+    else:
+        with gzip.open(temp_path, 'wb') as f:
+            pickle.dump(dataframe, f)
+    if os.path.isdir(save_path):
+        shutil.rmtree(save_path)
+    os.replace(temp_path, save_path)
+
+    # Keep each table in one format only, otherwise a stale copy may be read
+    for other_format, suffix in SNAPSHOT_SUFFIX_DICT.items():
+        other_path = os.path.join(snapshot_dir, table_name.lower() + suffix)
+        if other_format == snapshot_format:
+            continue
+        if os.path.isdir(other_path):
+            shutil.rmtree(other_path)
+        elif os.path.isfile(other_path):
+            os.remove(other_path)
+
+    return save_path
+
+
+def read_snapshot_table(snapshot_dir, table_name, columns=None, filters=None):
+    """
+    :param snapshot_dir: Snapshot directory, e.g. cbond_tables/<date>
+    :param table_name: Name of the table
+    :param columns: Columns to load, None for all columns. Only these columns are decompressed from parquet
+    :param filters: Row filters as a list of (column, operator, value), e.g. [('publishdate', '>=', '2022-01-01')].
+        Parquet row groups whose statistics cannot match are skipped without decompressing
+    :return: DataFrame of the table
+    """
+    path = get_snapshot_path(snapshot_dir, table_name)
+    if path is None:
+        raise FileNotFoundError(f'{table_name} is not in {snapshot_dir}')
+
+    if path.endswith(SNAPSHOT_SUFFIX_DICT['parquet']):
+        return pq.read_table(path, columns=columns, filters=filters, use_threads=True).to_pandas()
+
+    # Old pkl.gz snapshots always load the whole table, select rows and columns afterwards
+    dataframe = pd.read_pickle(path)
+    if filters is not None:
+        for col, op, value in filters:
+            dataframe = dataframe[FILTER_OPERATOR_DICT[op](dataframe[col], value)]
+        dataframe = dataframe.reset_index(drop=True)
+    if columns is not None:
+        dataframe = dataframe[columns]
+    return dataframe
+
+
+def get_file_fingerprint(path, block_size=1 << 20):
+    """
+    :param path: Path of a file
+    :param block_size: Bytes read at a time
+    :return: sha256 hex digest of the file content
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def get_snapshot_files(snapshot_path):
+    """
+    :param snapshot_path: Path of a table inside a snapshot, a file or a partitioned parquet directory
+    :return: Sorted paths of the data files of the table
+    """
+    if os.path.isfile(snapshot_path):
+        return [snapshot_path]
+    return sorted(os.path.join(root, file_name) for root, _, file_names in os.walk(snapshot_path)
+                  for file_name in file_names if not file_name.endswith('.tmp'))
+
+
+def link_to_blob(path, digest, blob_dir):
+    """
+    :param path: Path of a data file inside a snapshot
+    :param digest: sha256 hex digest of the file
+    :param blob_dir: Directory of the content addressed blob store
+    :return: None. The file and the blob named by its digest become hard links of the same inode
+    """
+    blob_path = os.path.join(blob_dir, digest[:2], digest + os.path.splitext(path)[1])
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    try:
+        # First copy of this content: the file itself becomes the blob
+        os.link(path, blob_path)
+        return
+    except FileExistsError:
+        pass
+    if os.path.samefile(path, blob_path):
+        return
+    # Same content stored before: replace the file by a link to the blob, through a temp link so that the
+    # table never disappears
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    os.link(blob_path, temp_path)
+    os.replace(temp_path, path)
+
+
+def dedup_snapshot_table(snapshot_dir, table_name, blob_dir):
+    """
+    :param snapshot_dir: Snapshot directory, e.g. cbond_tables/<date>
+    :param table_name: Name of the table
+    :param blob_dir: Directory of the content addressed blob store, on the same file system as snapshot_dir
+    :return: Fingerprint of the table. A table byte-identical to one stored before is kept only once on disk
+    """
+    path = get_snapshot_path(snapshot_dir, table_name)
+    if path is None:
+        raise FileNotFoundError(f'{table_name} is not in {snapshot_dir}')
+
+    file_digest_dict = {}
+    for file_path in get_snapshot_files(path):
+        digest = get_file_fingerprint(file_path)
+        file_digest_dict[os.path.relpath(file_path, path)] = digest
+        try:
+            link_to_blob(file_path, digest, blob_dir)
+        except OSError as e:
+            # File systems without hard links still get the fingerprint, the table is just not deduplicated
+            print(f'[!] {file_path} is not deduplicated: {e}')
+
+    # A partitioned table is fingerprinted by the names and digests of its parts
+    fingerprint = hashlib.sha256(json.dumps(file_digest_dict, sort_keys=True).encode()).hexdigest()
+    # Inode and size of every part, a table rewritten later gets new files and no longer matches the sidecar
+    file_stat_dict = {os.path.relpath(file_path, path): [os.stat(file_path).st_ino, os.stat(file_path).st_size]
+                      for file_path in get_snapshot_files(path)}
+    with open(os.path.join(snapshot_dir, table_name.lower() + FINGERPRINT_SUFFIX), 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'files': file_stat_dict}, f)
+
+    return fingerprint
+
+
+def get_table_fingerprint(snapshot_dir, table_name):
+    """
+    :param snapshot_dir: Snapshot directory, e.g. cbond_tables/<date>
+    :param table_name: Name of the table
+    :return: Fingerprint of the table, equal fingerprints mean byte-identical tables. Read from the sidecar written
+        by dedup_snapshot_table while the table has not been rewritten since, computed otherwise
+    """
+    path = get_snapshot_path(snapshot_dir, table_name)
+    if path is None:
+        raise FileNotFoundError(f'{table_name} is not in {snapshot_dir}')
+    file_list = get_snapshot_files(path)
+
+    fingerprint_path = os.path.join(snapshot_dir, table_name.lower() + FINGERPRINT_SUFFIX)
+    if os.path.exists(fingerprint_path):
+        with open(fingerprint_path) as f:
+            fingerprint_dict = json.load(f)
+        file_stat_dict = {os.path.relpath(file_path, path): [os.stat(file_path).st_ino, os.stat(file_path).st_size]
+                          for file_path in file_list}
+        if fingerprint_dict['files'] == file_stat_dict:
+            return fingerprint_dict['fingerprint']
+
+    file_digest_dict = {os.path.relpath(file_path, path): get_file_fingerprint(file_path) for file_path in file_list}
+    return hashlib.sha256(json.dumps(file_digest_dict, sort_keys=True).encode()).hexdigest()
+
+
+def prune_blob_store(blob_dir):
+    """
+    :param blob_dir: Directory of the content addressed blob store
+    :return: Number of removed blobs. A blob with a single link is not used by any snapshot any more
+    """
+    num_removed = 0
+    for root, _, file_names in os.walk(blob_dir):
+        for file_name in file_names:
+            blob_path = os.path.join(root, file_name)
+            if os.stat(blob_path).st_nlink == 1:
+                os.remove(blob_path)
+                num_removed += 1
+    return num_removed
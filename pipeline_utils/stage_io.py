@@ -0,0 +1,106 @@
+import os
+import ast
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Formats of the files passed between stages (second_filter, bond_related_news, single_default_label, jieba_score).
+# parquet keeps the list columns as native list<string> columns, csv holds them as Python reprs like "['a', 'b']".
+STAGE_SUFFIX_DICT = {'parquet': '.parquet', 'csv': '.csv'}
+
+# List columns of the stage files, parsed back into lists when an old csv file is read
+LIST_COLUMNS = ['Windcodes', 'Source', 'Sections', 'Areacodes', 'Industrycodes', 'Mktsentiments', 'Newslevels',
+                's_info_windcode', 'b_info_issuercode', 'linked_issuercode']
+
+
+def write_stage_frame(dataframe, output_dir, file_stem, stage_format='parquet'):
+    """
+    :param dataframe: DataFrame to save
+    :param output_dir: Output directory of the stage
+    :param file_stem: File name without suffix, e.g. '20220115_secondfilter'
+    :param stage_format: 'parquet' or 'csv'
+    :return: Path of the saved file
+    """
+    if stage_format not in STAGE_SUFFIX_DICT:
+        raise ValueError(f'Unknown stage format: {stage_format}')
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    save_path = os.path.join(output_dir, file_stem + STAGE_SUFFIX_DICT[stage_format])
+
+    if stage_format == 'parquet':
+        # Write into a temp file first, the next stage never reads a half written file
+        temp_path = save_path + '.tmp'
+        pq.write_table(pa.Table.from_pandas(dataframe, preserve_index=False), temp_path, compression='zstd')
+        os.replace(temp_path, save_path)
+    else:
+        dataframe.to_csv(save_path, index=False, encoding='utf_8_sig')
+
+    # Keep each file in one format only, otherwise the next stage reads the day twice
+    for other_format, suffix in STAGE_SUFFIX_DICT.items():
+        other_path = os.path.join(output_dir, file_stem + suffix)
+        if other_format != stage_format and os.path.isfile(other_path):
+            os.remove(other_path)
+
+    return save_path
+
+
+def get_stage_format(path):
+    """
+    :param path: File written by write_stage_frame
+    :return: Its stage format, 'parquet' or 'csv'
+    """
+    for stage_format, suffix in STAGE_SUFFIX_DICT.items():
+        if path.endswith(suffix):
+            return stage_format
+    raise ValueError(f'Unknown stage file: {path}')
+
+
+def get_file_stem(path):
+    """
+    :param path: File written by write_stage_frame
+    :return: File name without suffix, e.g. '20220115_listfilter_bond'
+    """
+    return os.path.basename(path)[:-len(STAGE_SUFFIX_DICT[get_stage_format(path)])]
+
+
+def parse_list_reprs(series):
+    """
+    :param series: Series of list reprs like "['a', 'b']"
+    :return: object array of lists, each distinct repr parsed once by ast.literal_eval (no code is run)
+    """
+    codes, uniques = pd.factorize(series)
+    parsed_uniques = [ast.literal_eval(value) if isinstance(value, str) else value for value in uniques]
+    # Code -1 (missing value) stays missing
+    return pd.Series(parsed_uniques + [None], dtype=object).to_numpy()[codes]
+
+
+def read_stage_frame(path, columns=None):
+    """
+    :param path: File written by write_stage_frame, parquet or csv
+    :param columns: Columns to load, None for all columns
+    :return: DataFrame with the list columns as Python lists
+    """
+    if path.endswith(STAGE_SUFFIX_DICT['parquet']):
+        table = pq.read_table(path, columns=columns)
+        dataframe = table.to_pandas()
+        # Arrow gives numpy arrays for list cells, the stages work on lists
+        for field in table.schema:
+            if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+                dataframe[field.name] = pd.Series(table.column(field.name).to_pylist(), dtype=object).to_numpy()
+        return dataframe
+
+    # Old csv files hold the list columns as reprs
+    dataframe = pd.read_csv(path, usecols=columns)
+    for col in LIST_COLUMNS:
+        if col in dataframe.columns and dataframe[col].map(type).eq(str).any():
+            dataframe[col] = parse_list_reprs(dataframe[col])
+    return dataframe
+
+
+def list_stage_files(input_dir):
+    """
+    :param input_dir: Output directory of the previous stage
+    :return: Sorted paths of its stage files
+    """
+    return sorted(os.path.join(input_dir, file_name) for file_name in os.listdir(input_dir)
+                  if file_name.endswith(tuple(STAGE_SUFFIX_DICT.values())))
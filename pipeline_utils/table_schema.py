@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtype of the columns of each table (lower case, as saved in cbond_tables or by the stages):
+#   'code': categorical, codes repeat over many rows (bonds of one issuer, records of one bond)
+#   'date': nullable Int32 YYYYMMDD, still turned into 'YYYYMMDD' by str(int(x)) and parsed by format='%Y%m%d'
+# Numeric columns not listed are downcast to the narrowest width that keeps every value.
+TABLE_SCHEMA_DICT = {
+    'cbonddescriptionzl': {'s_info_windcode': 'code', 'b_info_issuercode': 'code', 'b_info_issuer': 'code',
+                           'b_info_specialbondtype': 'code', 'b_info_maturitydate': 'date'},
+    'cbondissuerzl': {'s_info_windcode': 'code', 's_info_compcode': 'code'},
+    'cbondindustrywindzl': {'s_info_windcode': 'code', 's_info_industryname': 'code', 's_info_industryname2': 'code'},
+    'cbonddefaultreportform': {'b_info_windcode': 'code', 'b_default_date': 'date'},
+    'bond_profile': {'s_info_windcode': 'code', 's_info_compcode': 'code', 'b_info_issuercode': 'code',
+                     'b_info_issuer': 'code', 'b_info_maturitydate': 'date', 'b_default_date': 'date',
+                     'bond_type': 'code', 'bond_group': 'code'},
+}
+
+
+def to_compact_date(series):
+    """
+    :param series: Dates as datetime64, 'YYYYMMDD' strings or YYYYMMDD numbers
+    :return: Int32 YYYYMMDD Series, the series unchanged if some value is not such a date
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y%m%d').astype(float).astype('Int32')
+    compact_series = pd.to_numeric(series.astype(object).where(series.notnull(), None), errors='coerce')
+    is_valid = compact_series.isnull() == series.isnull()
+    is_valid &= compact_series.dropna().between(10000101, 99991231).all() and (compact_series.dropna() % 1 == 0).all()
+    if not is_valid.all():
+        return series
+    return compact_series.astype('Int32')
+
+
+def to_compact_numeric(series):
+    """
+    :param series: Numeric Series
+    :return: Series in the narrowest integer or float dtype holding exactly the same values
+    """
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_extension_array_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        float32_series = series.astype(np.float32)
+        # float32 keeps about 7 significant digits, downcast only when no value changes
+        if np.array_equal(float32_series.astype(np.float64).to_numpy(), series.to_numpy(), equal_nan=True):
+            return float32_series
+    return series
+
+
+def compact_table(dataframe, table_name):
+    """
+    :param dataframe: Table to compact, changed in place
+    :param table_name: Name of the table in TABLE_SCHEMA_DICT, tables not listed only get their numerics downcast
+    :return: The same DataFrame with compact dtypes
+    """
+    schema = TABLE_SCHEMA_DICT.get(table_name.lower(), {})
+    for col in dataframe.columns:
+        kind = schema.get(col)
+        if kind == 'code':
+            dataframe[col] = dataframe[col].astype('category')
+        elif kind == 'date':
+            dataframe[col] = to_compact_date(dataframe[col])
+        elif pd.api.types.is_numeric_dtype(dataframe[col]):
+            dataframe[col] = to_compact_numeric(dataframe[col])
+    return dataframe
@@ -11,6 +11,7 @@ from generate_model_output import generate_model_output
 
 data_date = '2022-02-15'
 update_data = True
+relabel_defaults = True
 
 ### update the data from mySQLDB
 if update_data == True:
@@ -40,6 +41,17 @@ print('-----------------------------------------------')
 print('Finish generate default labels')
 print('-----------------------------------------------')
 
+### Step 4.1: relabel the earlier versions' news linked to the issuers whose default dates changed, then their jieba scores and panel tables
+if relabel_defaults == True:
+    # data_version is data_date resolved by the config (the latest version when data_date is None), it holds the new default dates
+    data_version, relabeled_dict = generate_default_labels.relabel_default_labels(data_date=data_date)
+    for version, publish_dates in relabeled_dict.items():
+        generate_news_jiebascore.generate_news_jiebascore(data_date=version, publish_dates=publish_dates)
+        generate_panel_table.generate_panel_table(data_date=version, bond_profile_date=data_version)
+    print('-----------------------------------------------')
+    print('Finish relabel default labels of', len(relabeled_dict), 'earlier versions')
+    print('-----------------------------------------------')
+
 ### Step 5: generate news jieba score
 generate_news_jiebascore.generate_news_jiebascore(data_date=data_date)
 print('-----------------------------------------------')
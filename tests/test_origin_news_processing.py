@@ -0,0 +1,66 @@
+import os
+import sys
+import types
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'generate_origin_news'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import origin_news_processing
+
+
+NEAR_DEDUP_CONFIG = types.SimpleNamespace(shingle_size=5, minhash_num_perm=64, lsh_bands=16, near_dedup_threshold=0.8)
+
+ISSUER_LIST = ['华北能源投资集团', '江南城市建设发展', '东海港口控股集团', '西部交通投资运营',
+               '中原水务环境发展', '南方电网配售电', '北方钢铁集团股份', '沿海高速公路建设']
+
+NOTICE_TEMPLATE = ('关于{issuer}公司债券二零二四年付息公告本公司及董事会全体成员保证公告内容真实准确完整没有虚假记载误导性陈述或者重大遗漏'
+                   '为保证本期债券付息工作的顺利进行方便投资者及时领取利息现将有关事宜公告如下本期债券基本情况债券名称{issuer}公司债券'
+                   '本次付息方案按照本期债券票面利率计算每手面值一千元的本期债券派发利息付息债权登记日及付息日详见本公告付息对象为'
+                   '截至债权登记日下午收市后在中国证券登记结算有限责任公司登记在册的全体本期债券持有人')
+
+
+def get_news_frame(contents, windcodes, publish_times):
+    return pd.DataFrame({'News_ID': [str(i).zfill(22) for i in range(len(contents))],
+                         'TempContent': contents,
+                         'Windcodes': windcodes,
+                         'publishDate': '20240115',
+                         'publishTime': publish_times})
+
+
+def test_templated_notices_of_different_issuers_are_kept():
+    # Same template, each issuer with its own Windcodes: no news may be dropped, or its issuer never reaches the next stages
+    contents = [NOTICE_TEMPLATE.format(issuer=issuer) for issuer in ISSUER_LIST]
+    windcodes = [['C' + str(i)] for i in range(len(ISSUER_LIST))]
+    publish_times = ['09:00:0' + str(i) for i in range(len(ISSUER_LIST))]
+    kept, news_clusters = origin_news_processing.drop_near_duplicated_news(get_news_frame(contents, windcodes, publish_times), NEAR_DEDUP_CONFIG)
+
+    assert len(kept) == len(ISSUER_LIST)
+    assert sorted(code for codes in kept.Windcodes for code in codes) == sorted(code for codes in windcodes for code in codes)
+    assert news_clusters.empty
+
+
+def test_reposts_of_the_same_notice_are_dropped():
+    # A lightly edited repost with the same Windcodes is still a near-duplicate, the earliest news is kept
+    notice = NOTICE_TEMPLATE.format(issuer=ISSUER_LIST[0])
+    contents = [notice, notice.replace('详见本公告', '详见本次公告'), NOTICE_TEMPLATE.format(issuer=ISSUER_LIST[1])]
+    kept, news_clusters = origin_news_processing.drop_near_duplicated_news(
+        get_news_frame(contents, [['C0'], ['C0'], ['C1']], ['10:00:00', '09:00:00', '09:30:00']), NEAR_DEDUP_CONFIG)
+
+    assert sorted(kept.News_ID) == [str(1).zfill(22), str(2).zfill(22)]
+    # news_clusters lists every news of the cluster, its representative included
+    assert sorted(news_clusters.News_ID) == [str(0).zfill(22), str(1).zfill(22)]
+    assert news_clusters.Cluster_ID.tolist() == [str(1).zfill(22)] * 2
+    assert (news_clusters.Similarity >= NEAR_DEDUP_CONFIG.near_dedup_threshold).all()
+
+
+def test_clusters_are_not_chained_through_members():
+    # b agrees with a on 8 of 10 values, c agrees with b on 8 values but with a on 6 only: c must not join a's cluster
+    a = np.arange(10, dtype=np.uint32)
+    b = a.copy()
+    b[8:] += 100
+    c = b.copy()
+    c[:2] += 100
+    clusters = origin_news_processing.cluster_near_duplicated_news(np.vstack([a, b, c]), num_bands=10, threshold=0.8)
+
+    assert clusters.tolist() == [0, 0, 2]
@@ -0,0 +1,19 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from pipeline_utils import seen_content
+
+
+def test_rerun_of_a_version_keeps_the_other_versions(tmp_path):
+    store_dir = str(tmp_path)
+    seen_content.update_seen_content(np.array([5, 7], dtype=np.uint64), store_dir, '2024-01-15')
+    seen_content.update_seen_content(np.array([5, 9], dtype=np.uint64), store_dir, '2024-02-15')
+    # The first version is run again and no longer has content 5, the second version still had it
+    seen_content.update_seen_content(np.array([7], dtype=np.uint64), store_dir, '2024-01-15')
+
+    fingerprints = np.array([5, 7, 9], dtype=np.uint64)
+    assert seen_content.is_seen_content(fingerprints, store_dir, '2024-03-15').tolist() == [True, True, True]
+    assert seen_content.is_seen_content(fingerprints, store_dir, '2024-02-15').tolist() == [False, True, False]
+    assert seen_content.is_seen_content(fingerprints, store_dir, '2024-01-15').tolist() == [False, False, False]